@@ -1,85 +1,361 @@
+import threading
+import time
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from collections import defaultdict
 from tqdm import tqdm
 
+from batch_search import beam_search_batch, pack_results
+from csr_graph import CSRGraph, EvalCounter, best_first_search, thread_visited_table
+from index_io import load_index_dir, save_index_dir
+from vector_ops import blocked_top_k
+
+# Comparison operators accepted in filter specs, e.g. {"frequency_rank": {"lt": 1000}}
+FILTER_OPS = {
+    "eq": np.equal, "ne": np.not_equal, "lt": np.less, "le": np.less_equal,
+    "gt": np.greater, "ge": np.greater_equal, "in": np.isin,
+}
+
 
 class ACORN1:
-    def __init__(self, hnsw_index, radius=0.5, max_neighbors=20):
+    def __init__(self, hnsw_index, radius=0.5, max_neighbors=20, ef_search=10, two_hop_cap=None,
+                 construction="hnsw", knn=None):
         """
         ACORN-1 reuses HNSW graph structure and augments it by adding local radius-based refinement.
+
+        The graphs cover the nodes of hnsw_index at build time; nodes inserted
+        into it later are only found by HNSW until ACORN-1 is rebuilt.
+        Tombstoned (deleted) HNSW nodes are never returned.
         
         Parameters:
         - hnsw_index: CompleteHNSW instance
         - radius: Cosine similarity threshold for local neighborhood expansion
         - max_neighbors: Maximum number of neighbors to consider for local expansion
+        - ef_search: Default candidate list size of the beam search
+        - two_hop_cap: Keep at most this many 2-hop neighbors per node, closest first (None = all)
+        - construction: How radius candidates are found. "hnsw" scores only the 1- and
+                        2-hop neighbors of each node in the HNSW base layer (linear in N);
+                        "gemm" is the exact search with blocked matrix multiplies (O(N²) flops)
+        - knn: Optional precomputed (ids, sims) from blocked_top_k(data, data, K, exclude_self=True)
+               with K >= max_neighbors; "gemm" construction slices it instead of recomputing
         """
         self.hnsw = hnsw_index
         self.radius = radius
         self.max_neighbors = max_neighbors
+        self.ef_search = ef_search
+        self.two_hop_cap = two_hop_cap
+        self.construction = construction
         self.data = hnsw_index.data
         self.num_nodes = len(self.data)
+        self.entry_point = hnsw_index.entry_point  # Fixed: later HNSW entry points may be new nodes
+        self._visited = threading.local()  # One VisitedTable per searching thread
+        self._search_evals = EvalCounter()  # Vectors scored by searches, from any thread
+        self.metadata = {}  # Field name -> per-node array, used by filtered searches
+
+        start = time.perf_counter()
+
+        # Augmented neighborhood graph (CSRGraph)
+        self.acorn_graph = self._augment_with_radius_neighbors(knn=knn)
+
+        # ACORN-1 expands every hop to the 2-hop neighborhood; precompute it once
+        self.two_hop = self._build_two_hop_graph()
+
+        self.build_time_s = time.perf_counter() - start
+        self.num_edges = self.acorn_graph.num_edges
+        print(f"✅ ACORN-1 built in {self.build_time_s:.2f}s ({construction}): "
+              f"{self.num_edges} radius edges, {self.two_hop.num_edges} 2-hop entries")
+
+    @property
+    def params(self):
+        """Build parameters, as stored in saved indexes."""
+        return {
+            "radius": self.radius, "max_neighbors": self.max_neighbors, "ef_search": self.ef_search,
+            "two_hop_cap": self.two_hop_cap, "construction": self.construction,
+        }
+
+    @property
+    def nbytes(self):
+        """Memory held by the radius graph and 2-hop lists (the vectors belong to the HNSW index)."""
+        return int(self.acorn_graph.nbytes + self.two_hop.nbytes)
+
+    def save(self, path):
+        """
+        Save the radius graph and the precomputed 2-hop lists. The HNSW index
+        is saved separately; the manifest records its build id so load() can
+        refuse to pair the graphs with a different HNSW build.
+        """
+        arrays = {}
+        arrays["radius_indptr"], arrays["radius_indices"] = self.acorn_graph.to_csr()
+        arrays["two_hop_indptr"], arrays["two_hop_indices"] = self.two_hop.to_csr()
+        manifest = {
+            "params": self.params,
+            "num_nodes": self.num_nodes,
+            "hnsw_checksum": self.hnsw.source_checksum,
+            "hnsw_build_id": self.hnsw.build_id,
+            "build_time_s": self.build_time_s,
+        }
+        save_index_dir(path, "acorn1", manifest, arrays)
+
+    @classmethod
+    def load(cls, path, hnsw_index, mmap=True):
+        """
+        Load an ACORN-1 index written by save() on top of an (already loaded) HNSW index.
+        """
+        manifest, arrays = load_index_dir(path, "acorn1", mmap=mmap)
+        if (manifest["hnsw_checksum"] != hnsw_index.source_checksum or manifest["num_nodes"] != hnsw_index.num_nodes
+                or manifest.get("hnsw_build_id") != hnsw_index.build_id):
+            raise ValueError(f"ACORN-1 index at {path} was built on a different HNSW index.")
+
+        index = cls.__new__(cls)
+        for name, value in manifest["params"].items():
+            setattr(index, name, value)
+        index.hnsw = hnsw_index
+        index.data = hnsw_index.data
+        index.num_nodes = manifest["num_nodes"]
+        index.entry_point = hnsw_index.entry_point
+        index._visited = threading.local()
+        index._search_evals = EvalCounter()
+        index.metadata = {}
+        index.acorn_graph = CSRGraph(arrays["radius_indptr"], arrays["radius_indices"])
+        index.two_hop = CSRGraph(arrays["two_hop_indptr"], arrays["two_hop_indices"])
+        index.build_time_s = manifest["build_time_s"]
+        index.num_edges = index.acorn_graph.num_edges
+        return index
+
+    def _augment_with_radius_neighbors(self, block_size=256, knn=None):
+        """
+        For each node, link the (at most max_neighbors) most similar nodes within the
+        cosine distance radius, then make every link bidirectional.
+        """
+        n = self.num_nodes
+        if self.construction == "gemm":
+            if knn is not None:
+                neighbors, sims = knn[0][:, :self.max_neighbors], knn[1][:, :self.max_neighbors]
+            else:
+                neighbors, sims = blocked_top_k(
+                    self.data, self.data, self.max_neighbors, exclude_self=True,
+                    desc="🔧 Building ACORN-1 Neighborhoods"
+                )
+            src = np.repeat(np.arange(n, dtype=np.int64), neighbors.shape[1])
+            dst = neighbors.ravel().astype(np.int64)
+            keep = sims.ravel() >= (1 - self.radius)
+            src, dst = src[keep], dst[keep]
+        elif self.construction == "hnsw":
+            base = self.hnsw.graphs[0]
+            src_parts, dst_parts = [], []
+            for start in tqdm(range(0, n, block_size), desc="🔧 Building ACORN-1 Neighborhoods"):
+                src, dst = _two_hop_pairs(base, np.arange(start, min(start + block_size, n)), n)
+                sims = np.einsum('ij,ij->i', self.data[src], self.data[dst])
+                keep = sims >= (1 - self.radius)
+                src, dst = _closest_per_row(src[keep], dst[keep], sims[keep], self.max_neighbors)
+                src_parts.append(src)
+                dst_parts.append(dst)
+            src, dst = np.concatenate(src_parts), np.concatenate(dst_parts)
+        else:
+            raise ValueError(f"Unknown construction '{self.construction}', expected 'hnsw' or 'gemm'.")
+
+        # Ensure bidirectional links
+        src, dst = np.divmod(np.unique(np.concatenate([src * n + dst, dst * n + src])), n)
+        return CSRGraph.from_edges(src, dst, n)
+
+    def _build_two_hop_graph(self, block_size=256):
+        """
+        Deduplicated 1- and 2-hop neighbors of every node, as a CSRGraph.
+
+        Nodes are processed in blocks with vectorized gathers; when two_hop_cap
+        is set, each list is pruned to the two_hop_cap neighbors most similar
+        to the node itself.
+        """
+        n = self.num_nodes
+        src_parts, dst_parts = [], []
+        for start in tqdm(range(0, n, block_size), desc="🔧 Precomputing ACORN-1 2-hop lists"):
+            src, dst = _two_hop_pairs(self.acorn_graph, np.arange(start, min(start + block_size, n)), n)
+            if self.two_hop_cap is not None:
+                sims = np.einsum('ij,ij->i', self.data[src], self.data[dst])
+                src, dst = _closest_per_row(src, dst, sims, self.two_hop_cap)
+            src_parts.append(src)
+            dst_parts.append(dst)
+
+        return CSRGraph.from_edges(np.concatenate(src_parts), np.concatenate(dst_parts), n)
+
+    # ========== Predicate filters ==========
+
+    def set_metadata(self, name, values):
+        """Attach one value per node (frequency rank, tag, ...) under `name` for filtering."""
+        values = np.asarray(values)
+        if len(values) != self.num_nodes:
+            raise ValueError(f"Metadata '{name}' has {len(values)} values, expected {self.num_nodes}.")
+        self.metadata[name] = values
 
-        # Augmented neighborhood graph
-        self.acorn_graph = self._augment_with_radius_neighbors()
+    def filter_mask(self, filter):
+        """
+        Evaluate a predicate into a boolean bitmap over all nodes.
+
+        filter is either a boolean array of length num_nodes or a dict of
+        conditions on metadata fields, all of which must hold:
+            {"tag": "noun"}                      equality
+            {"tag": ["noun", "verb"]}            membership
+            {"frequency_rank": {"lt": 1000}}     comparisons (see FILTER_OPS)
+        """
+        if not isinstance(filter, dict):
+            mask = np.asarray(filter, dtype=bool)
+            if mask.shape != (self.num_nodes,):
+                raise ValueError(f"Filter mask must have shape ({self.num_nodes},).")
+            return mask
+
+        mask = np.ones(self.num_nodes, dtype=bool)
+        for field, condition in filter.items():
+            if field not in self.metadata:
+                raise ValueError(f"Unknown metadata field '{field}', expected one of {sorted(self.metadata)}.")
+            values = self.metadata[field]
+            if not isinstance(condition, dict):
+                condition = {"in" if isinstance(condition, (list, tuple)) else "eq": condition}
+            for op, operand in condition.items():
+                if op not in FILTER_OPS:
+                    raise ValueError(f"Unknown filter operator '{op}', expected one of {sorted(FILTER_OPS)}.")
+                try:
+                    mask &= FILTER_OPS[op](values, operand)
+                except (TypeError, ValueError) as e:  # e.g. {"frequency_rank": "abc"}
+                    raise ValueError(f"Cannot compare '{field}' ({values.dtype}) with {operand!r} using '{op}'.") from e
+        return mask
 
-    def _augment_with_radius_neighbors(self):
+    def filter_strategy(self, mask):
         """
-        For each node, expand its neighborhood with vectors within a cosine distance radius.
+        "graph" if the filtered 2-hop graph is expected to stay connected,
+        i.e. each hop still reaches at least one passing node on average,
+        otherwise "brute_force" (score every passing node).
+        """
+        passing = int(np.count_nonzero(mask))
+        mean_two_hop = self.two_hop.num_edges / max(1, self.num_nodes)
+        if passing <= self.ef_search or passing / self.num_nodes * mean_two_hop < 1:
+            return "brute_force"
+        return "graph"
+
+    @property
+    def distance_evals(self):
+        """Running count of vectors scored by searches."""
+        return self._search_evals.value
+
+    def _brute_force_search(self, query_vector, mask, k):
+        """Exact top k among the passing nodes, scored on the float32 vectors even if quantized."""
+        nodes = np.flatnonzero(mask)
+        if self.hnsw.deleted:
+            nodes = np.setdiff1d(nodes, list(self.hnsw.deleted), assume_unique=True)
+        dists = 1 - self.data[nodes] @ query_vector
+        self._search_evals.add(len(nodes))
+        top = np.argsort(dists)[:k] if len(nodes) > k else np.argsort(dists)
+        return [(int(nodes[i]), float(dists[i])) for i in top]
+
+    # ========== Search ==========
+
+    def knn_search(self, query_vector, k=10, ef_search=None, start_node=None, trace=None, filter=None):
         """
-        graph = defaultdict(set)
-        for idx in tqdm(range(self.num_nodes), desc="🔧 Building ACORN-1 Neighborhoods"):
-            vec = self.data[idx].reshape(1, -1)
-            sims = cosine_similarity(vec, self.data)[0]
-            neighbor_indices = np.where(sims >= (1 - self.radius))[0]
+        Beam search over the 2-hop expanded ACORN-1 graph.
 
-            # Limit to max_neighbors
-            neighbor_indices = sorted(neighbor_indices, key=lambda i: -sims[i])
-            for neighbor in neighbor_indices[:self.max_neighbors]:
-                if neighbor != idx:
-                    graph[idx].add(neighbor)
-                    graph[neighbor].add(idx)  # Ensure bidirectional links
+        With a filter (see filter_mask), only nodes passing the predicate are
+        scored, expanded and returned: each hop looks up the 2-hop neighbors in
+        the bitmap before computing any distance, which keeps the filtered
+        subgraph connected. Filters too selective for that (filter_strategy)
+        are answered by an exact scan of the passing nodes, and graph searches
+        that end with fewer than k results are topped up the same way.
 
-        return {k: list(v) for k, v in graph.items()}
+        If trace (instrumentation.QueryTrace) is given, expansions, distance
+        evaluations, visited nodes and the search time are recorded under "acorn".
+        If the HNSW index is quantized, the search runs on its compressed codes
+        and the ef candidates are re-ranked with the float32 vectors.
+
+        Returns:
+            (List[Tuple[int, float]], List[int], int): up to k (node, cosine
+            distance) pairs sorted by distance, the expansion path and the start node
+        """
+        with self.hnsw.reading():
+            return self._knn_search(query_vector, k, ef_search, start_node, trace, filter)
 
-    def search(self, query_vector, start_node=None, force_best_entry=True):
+    def _knn_search(self, query_vector, k, ef_search, start_node, trace, filter):
         query_vector = query_vector / np.linalg.norm(query_vector)
         if start_node is None:
-            start_node = self.hnsw.entry_point
-
-        visited = set()
-        current_node = start_node
-        path = [current_node]
-        improved = True
-
-        while improved:
-            improved = False
-            visited.add(current_node)
-            current_vec = self.data[current_node]
-            current_dist = 1 - np.dot(query_vector, current_vec)
-
-            # ACORN-1: Expand to 2-hop neighbors
-            neighbors = set(self.acorn_graph.get(current_node, []))
-            for n in list(neighbors):
-                neighbors.update(self.acorn_graph.get(n, []))  # 2-hop
-
-            best_neighbor = None
-            best_dist = current_dist
-
-            for neighbor in neighbors:
-                if neighbor in visited:
-                    continue
-                neighbor_vec = self.data[neighbor]
-                neighbor_dist = 1 - np.dot(query_vector, neighbor_vec)
-                if neighbor_dist < best_dist:
-                    best_neighbor = neighbor
-                    best_dist = neighbor_dist
-
-            if best_neighbor is not None:
-                current_node = best_neighbor
-                path.append(current_node)
-                improved = True
-
-        return current_node, path, start_node
-
-                
\ No newline at end of file
+            start_node = self.entry_point
+        ef = max(ef_search or self.ef_search, k)
+        if trace is not None:
+            start = time.perf_counter_ns()
+
+        score = self.hnsw.distance_function(query_vector)
+        mask = self.filter_mask(filter) if filter is not None else None
+        if mask is not None and self.filter_strategy(mask) == "brute_force":
+            results = self._brute_force_search(query_vector, mask, k)
+            if trace is not None:
+                passing = int(np.count_nonzero(mask))
+                trace.record_layer("acorn", 0, 0, passing, passing, time.perf_counter_ns() - start)
+            return results, [], start_node
+
+        table = thread_visited_table(self._visited)
+        epoch = table.reset(self.num_nodes)
+        path = []
+        # A start node failing the filter routes the search but is never returned
+        results, scored = best_first_search(self.two_hop, score, [start_node], ef, table.marks, epoch,
+                                            mask=mask, expanded=path)
+
+        if trace is not None:
+            trace.record_layer("acorn", 0, len(path), scored, scored + 1, time.perf_counter_ns() - start)
+
+        if self.hnsw.quantizer is not None:
+            results = [(n, d) for d, n in self.hnsw.rerank(query_vector, [n for _, n in results])]
+            scored += len(results)
+        else:
+            results = [(int(n), d) for d, n in results]
+        self._search_evals.add(scored)
+        if self.hnsw.deleted:
+            results = [(n, d) for n, d in results if n not in self.hnsw.deleted]
+        if mask is not None and len(results) < k and len(results) < np.count_nonzero(mask):
+            results = self._brute_force_search(query_vector, mask, k)
+        return results[:k], path, start_node
+
+    def search(self, query_vector, start_node=None, force_best_entry=True, ef_search=None, trace=None,
+               filter=None):
+        """
+        ACORN-1 search for the single nearest node (optionally among nodes passing filter).
+
+        Raises:
+            ValueError: If no node passes the filter
+        """
+        results, path, start_node = self.knn_search(
+            query_vector, k=1, ef_search=ef_search, start_node=start_node, trace=trace, filter=filter
+        )
+        if not results:
+            raise ValueError("No node passes the filter.")
+        return results[0][0], path, start_node
+
+    def search_batch(self, queries, k=10, ef_search=None, start_nodes=None):
+        """
+        Search many queries at once over the 2-hop graph, advancing them in lockstep.
+
+        Returns:
+            (np.ndarray, np.ndarray): (n_queries, k) node ids and cosine
+            distances, sorted by distance; missing entries are -1 / inf
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        if start_nodes is None:
+            start_nodes = np.full(len(queries), self.entry_point, dtype=np.int64)
+        ef = max(ef_search or self.ef_search, k)
+
+        with self.hnsw.reading():
+            found = beam_search_batch(self.two_hop, self.data, queries, start_nodes, ef,
+                                      excluded=self.hnsw.deleted)
+        return pack_results(found, k)
+
+def _two_hop_pairs(graph, nodes, num_nodes):
+    """Unique (node, neighbor) pairs over the 1- and 2-hop neighborhoods of nodes, sorted by node."""
+    owner1, hop1 = graph.gather(nodes)
+    owner2, hop2 = graph.gather(hop1)
+    src = nodes[np.concatenate([owner1, owner1[owner2]])].astype(np.int64)
+    dst = np.concatenate([hop1, hop2]).astype(np.int64)
+    keep = src != dst
+    return np.divmod(np.unique(src[keep] * num_nodes + dst[keep]), num_nodes)
+
+
+def _closest_per_row(src, dst, sims, limit):
+    """Keep the `limit` most similar pairs of every source node (src must be sorted)."""
+    order = np.lexsort((-sims, src))
+    src, dst = src[order], dst[order]
+    rank = np.arange(len(src)) - np.searchsorted(src, src)
+    keep = rank < limit
+    return src[keep], dst[keep]
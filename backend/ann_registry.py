@@ -0,0 +1,200 @@
+# ann_registry.py
+"""
+Common interface of the compared ANN algorithms, and the registry the server
+and benchmark iterate over.
+
+An ANNIndex adapter wraps one index and exposes:
+- build(vectors, built, **params): construct it (built holds the adapters
+  already built, for algorithms layered on another, like ACORN-1 on HNSW)
+- search(query_vector, k, ef_search, trace, filter) -> SearchResult
+- search_batch(queries, k, ef_search) -> (ids, distances)
+- stats(): build time, memory, distance evaluations and parameters
+
+To compare a new algorithm, subclass ANNIndex and decorate it with @register;
+/query, /summary and benchmark.py pick it up through ANN_REGISTRY.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from hnsw_index import CompleteHNSW
+from acorn1_index import ACORN1
+from csr_graph import EvalCounter
+from vector_ops import blocked_top_k
+
+# top_k: (node, cosine distance) pairs; path: the algorithm's traversal (JSON-ready);
+# steps: nodes visited; extra: additional response fields (e.g. per-shard paths)
+SearchResult = namedtuple("SearchResult", ["top_k", "path", "steps", "extra"])
+
+ANN_REGISTRY = {}
+
+
+def register(cls):
+    """Class decorator adding an ANNIndex subclass to ANN_REGISTRY under cls.name."""
+    ANN_REGISTRY[cls.name] = cls
+    return cls
+
+
+def build_indexes(vectors, names=None, params=None):
+    """
+    Build the registered algorithms `names` (default: all) over vectors, in
+    registry order so dependencies come first.
+
+    Args:
+        vectors (np.ndarray): Normalized vectors, shape (n, dim)
+        names (Iterable[str], optional): Registry names to build
+        params (Dict[str, dict], optional): Build parameters per name
+
+    Returns:
+        Dict[str, ANNIndex]
+    """
+    names, params = set(names or ANN_REGISTRY), params or {}
+    built = {}
+    for name, cls in ANN_REGISTRY.items():
+        if name in names:
+            missing = [dep for dep in cls.requires if dep not in built]
+            if missing:
+                raise ValueError(f"'{name}' needs {missing} to be built as well.")
+            built[name] = cls.build(vectors, built, **params.get(name, {}))
+    return built
+
+
+class ANNIndex:
+    name = None           # Registry key and JSON key of its results
+    label = None          # Display name
+    requires = ()         # Names of the adapters build() needs in `built`
+    supports_filter = False
+
+    def __init__(self, index):
+        self.index = index
+
+    @classmethod
+    def build(cls, vectors, built, **params):
+        raise NotImplementedError
+
+    def search(self, query_vector, k=10, ef_search=None, trace=None, filter=None):
+        raise NotImplementedError
+
+    def search_batch(self, queries, k=10, ef_search=None):
+        return self.index.search_batch(queries, k=k, ef_search=ef_search)
+
+    def describe_filter(self, mask):
+        """Extra response fields about how a filtered search ran."""
+        return {}
+
+    @property
+    def distance_evals(self):
+        return self.index.distance_evals
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes
+
+    def stats(self):
+        """
+        distance_evals counts vectors scored by single-query searches only, never by the build.
+        Sharded indexes also report build_wall_time_s, the parallel build of all their shards.
+        """
+        stats = {
+            "label": self.label,
+            "build_time_s": round(getattr(self.index, "build_time_s", 0.0), 3),
+            "nbytes": int(self.nbytes),
+            "distance_evals": int(self.distance_evals),
+            "params": getattr(self.index, "params", {}),
+        }
+        if hasattr(self.index, "build_wall_time_s"):
+            stats["build_wall_time_s"] = round(self.index.build_wall_time_s, 3)
+        return stats
+
+
+@register
+class HNSWIndex(ANNIndex):
+    name = "hnsw"
+    label = "HNSW"
+
+    @classmethod
+    def build(cls, vectors, built, **params):
+        return cls(CompleteHNSW(vectors, **params))
+
+    def search(self, query_vector, k=10, ef_search=None, trace=None, filter=None):
+        extra, kwargs = {}, {}
+        if getattr(self.index, "num_shards", 1) > 1:
+            kwargs["shard_logs"] = extra["shards"] = []
+        top_k, log, _ = self.index.knn_search(query_vector, k=k, ef_search=ef_search, trace=trace, **kwargs)
+        path = {str(int(layer)): [int(x) for x in nodes] for layer, nodes in log.items()}
+        return SearchResult(top_k, path, sum(len(nodes) for nodes in log.values()), extra)
+
+    def stats(self):
+        return {**super().stats(), "num_edges": int(getattr(self.index, "num_edges", 0)),
+                "build_distance_evals": int(getattr(self.index, "build_distance_evals", 0))}
+
+
+@register
+class ACORN1Index(ANNIndex):
+    name = "acorn"
+    label = "ACORN-1"
+    requires = ("hnsw",)
+    supports_filter = True
+
+    @classmethod
+    def build(cls, vectors, built, **params):
+        return cls(ACORN1(built["hnsw"].index, **params))
+
+    def search(self, query_vector, k=10, ef_search=None, trace=None, filter=None):
+        # Starts from the HNSW entry point
+        extra, kwargs = {}, {}
+        if getattr(self.index, "num_shards", 1) > 1:
+            kwargs["shard_logs"] = extra["shards"] = []
+        top_k, path, _ = self.index.knn_search(query_vector, k=k, ef_search=ef_search, trace=trace,
+                                                filter=filter, **kwargs)
+        return SearchResult(top_k, [int(x) for x in path], len(path), extra)
+
+    def describe_filter(self, mask):
+        return {"strategy": self.index.filter_strategy(mask)}
+
+    def stats(self):
+        return {**super().stats(), "num_edges": int(getattr(self.index, "num_edges", 0))}
+
+
+@register
+class FlatIndex(ANNIndex):
+    """Exact brute-force baseline: one matrix-vector product per query, recall 1 by construction."""
+    name = "flat"
+    label = "Exact (flat)"
+    supports_filter = True
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.data = data
+        self._search_evals = EvalCounter()
+
+    @classmethod
+    def build(cls, vectors, built, **params):
+        return cls(np.asarray(vectors, dtype=np.float32))
+
+    def search(self, query_vector, k=10, ef_search=None, trace=None, filter=None):
+        query_vector = query_vector / np.linalg.norm(query_vector)
+        nodes = np.flatnonzero(filter) if filter is not None else None
+        dists = 1 - (self.data if nodes is None else self.data[nodes]) @ query_vector
+        self._search_evals.add(len(dists))
+        top = np.argpartition(dists, k - 1)[:k] if len(dists) > k else np.arange(len(dists))
+        top = top[np.argsort(dists[top])]
+        ids = top if nodes is None else nodes[top]
+        return SearchResult([(int(n), float(d)) for n, d in zip(ids, dists[top])], [], len(dists), {})
+
+    def search_batch(self, queries, k=10, ef_search=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        ids, sims = blocked_top_k(queries, self.data, k)
+        return ids, 1 - sims
+
+    def describe_filter(self, mask):
+        return {"strategy": "brute_force"}
+
+    @property
+    def distance_evals(self):
+        return self._search_evals.value
+
+    @property
+    def nbytes(self):
+        return int(self.data.nbytes)
@@ -1,148 +1,394 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Blueprint, Flask, current_app, request, jsonify, send_from_directory
 from flask_cors import CORS
-from sentence_transformers import SentenceTransformer
+from functools import wraps
 import numpy as np
+import gc
+import json
+import os
 import time
 
-from glove_loader import load_glove_embeddings
-from hnsw_index import CompleteHNSW
-from acorn1_index import ACORN1
+from instrumentation import QueryTrace, phase
+from server_state import ServerState, b64_array
 from vector_ops import (
-    reduce_dimensions,
     compute_cosine_similarity,
-    normalize_vectors,
     get_query_embedding,
-    fit_sbert_to_glove_pca,
-    get_pca_info
+    get_query_embeddings
 )
 
-app = Flask(__name__, static_folder='../frontend', static_url_path='')
-CORS(app)  # Allow frontend requests
+# Prebuilt indexes (and the cached PCA projections) are saved here and reused
+# while the vectors and parameters match
+INDEX_DIR = "index_cache"
+# VECTOR_QUANTIZATION=sq8|pq searches on compressed codes and re-ranks with float32
+HNSW_PARAMS = {"M": 10, "seed": 0, "quantization": os.environ.get("VECTOR_QUANTIZATION") or None}
+ACORN_PARAMS = {}
+# INDEX_SHARDS=K splits the vectors into K shards built in parallel processes and
+# searched scatter-gather (see sharded_index.py)
+NUM_SHARDS = int(os.environ.get("INDEX_SHARDS", "1"))
+# Written by sweep.py, plotted by the summary tab
+SWEEP_RESULTS_PATH = "sweep_results.json"
+# Trace every /query (distance evaluations, per-layer stats, phase timings);
+# a single request can also opt in with {"instrument": true}
+INSTRUMENT_QUERIES = os.environ.get("INSTRUMENT_QUERIES", "0") == "1"
+# Optional {word: tag} JSON (e.g. part of speech), exposed to filtered queries as "tag"
+WORD_TAGS_PATH = os.environ.get("WORD_TAGS_PATH", "word_tags.json")
+# Largest k accepted by /query and /batch_query
+MAX_K = 100
+# Most words accepted by one /batch_query request
+MAX_BATCH_WORDS = 1000
+
+CONFIG = {
+    "glove_path": "glove.6B.100d.txt",
+    "max_words": 2500,
+    "index_dir": INDEX_DIR,
+    "hnsw_params": HNSW_PARAMS,
+    "acorn_params": ACORN_PARAMS,
+    "num_shards": NUM_SHARDS,
+    "algorithms": ("hnsw", "acorn", "flat"),  # Compared side by side (see ann_registry.py)
+    "word_tags_path": WORD_TAGS_PATH,
+    "sbert_model": "all-MiniLM-L6-v2",
+    "search_log_size": 1000,  # Recent /query entries kept for /summary
+    "encode_batch_size": 32,  # Most out-of-vocabulary words per SBERT forward pass
+    "encode_wait_ms": 5,      # Longest wait for more words before encoding a batch
+    "search_threads": 4,      # Index searches running at once per process
+}
+
+routes = Blueprint("routes", __name__)
+
+
+def create_app(config=None, start=True, attach=False):
+    """
+    Create the Flask app. Components load in background threads (see
+    server_state.py), so the app can serve /health and static files at once;
+    endpoints that need a component answer 503 until it is ready.
+
+    Parameters:
+    - config: Overrides for CONFIG
+    - start: Start loading right away (otherwise call app.extensions["state"].start())
+    - attach: Only memory-map artifacts written by publish_artifacts() (pre-forked workers)
+    """
+    app = Flask(__name__, static_folder='../frontend', static_url_path='')
+    CORS(app)  # Allow frontend requests
+    app.extensions["state"] = ServerState({**CONFIG, **(config or {}), "attach": attach})
+    app.register_blueprint(routes)
+    if start:
+        app.extensions["state"].start()
+    return app
+
+
+def publish_artifacts(config=None):
+    """
+    Build (or verify) the embeddings cache, 3D projection and indexes in this
+    process and publish them for create_app(attach=True) workers.
+
+    The state is closed and released before returning, so a pre-fork master
+    keeps neither threads nor the in-heap indexes it built when it forks.
+    """
+    state = ServerState({**CONFIG, **(config or {})})
+    try:
+        state.load()
+        state.publish()
+        print(f"✅ Published serving artifacts in {state.config['index_dir']}/")
+    finally:
+        state.close()
+        del state
+        gc.collect()  # The encoder's _LazyModel holds the state in a reference cycle
+
+
+def _state():
+    return current_app.extensions["state"]
+
+
+def requires(*components):
+    """Answer 503 with the loading status until all components are ready."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            state = _state()
+            if not state.is_ready(*components):
+                return jsonify({"error": "Server is still starting", **state.health()}), 503
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _int_param(data, name, default):
+    """
+    data[name] as an int, or default when it is missing or null. Integral
+    numbers and numeric strings are accepted; booleans and fractions are not.
+    """
+    value = data.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"'{name}' must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+
+
+def _search_params(data):
+    """
+    Validated (k, ef_search) of a search request.
+
+    Raises:
+        ValueError: If k is not an integer in [1, MAX_K] or ef_search is not a positive integer
+    """
+    k = _int_param(data, "k", 5)
+    ef_search = _int_param(data, "ef_search", None)
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"'k' must be between 1 and {MAX_K}")
+    if ef_search is not None and ef_search < 1:
+        raise ValueError("'ef_search' must be a positive integer")
+    return k, ef_search
 
-# ========== Load & Preprocess ==========
-print("Loading GloVe embeddings...")
-texts, vectors = load_glove_embeddings("glove.6B.100d.txt", max_words=2500)
-vectors = normalize_vectors(vectors)
 
-print(" Loading SBERT model...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
+def _similarity(query_vector, vectors, node):
+    return float(compute_cosine_similarity(query_vector, np.atleast_2d(vectors[int(node)]))[0])
 
-print(" Fitting SBERT → GloVe PCA...")
-sbert_to_glove_pca = fit_sbert_to_glove_pca(model, texts, glove_dim=100)
 
-print(" Reducing GloVe to 3D for visualization...")
-pca_3d = reduce_dimensions(vectors, n_components=3)
+def _search_all(ann, query_vector, pool=None, **kwargs):
+    """
+    Run every algorithm's search (on pool if given, concurrently).
 
-print(" Building HNSW and ACORN-1 indexes...")
-hnsw_index = CompleteHNSW(vectors, M=10)
-acorn_index = ACORN1(hnsw_index)
+    Returns:
+        Dict[str, Tuple[SearchResult, float]]: result and time in ms per algorithm
+    """
+    def run(index):
+        filter = kwargs.get("filter") if index.supports_filter else None
+        return _timed(index.search, query_vector, **{**kwargs, "filter": filter})
 
-retained_variance = get_pca_info(pca_3d, n_components=3)
+    if pool is None:
+        return {name: run(index) for name, index in ann.items()}
+    futures = {name: pool.submit(run, index) for name, index in ann.items()}
+    return {name: future.result() for name, future in futures.items()}
 
 
-search_log = []  # Stores all searched words + results
+def _log_row(result, time_ms, query_vector, vectors):
+    """One algorithm's entry in the search log."""
+    return {
+        "time_ms": round(time_ms, 2),
+        "steps": int(result.steps),
+        "sim": _similarity(query_vector, vectors, result.top_k[0][0])
+    }
+
+
+def _timed(search, *args, **kwargs):
+    """search(*args, **kwargs) and its wall time in ms, for state.search_pool."""
+    start = time.time()
+    result = search(*args, **kwargs)
+    return result, (time.time() - start) * 1000
 
 
 # ========== Routes ==========
 
-@app.route('/')
+@routes.route("/health", methods=["GET"])
+def health():
+    report = _state().health()
+    return jsonify(report), 200 if report["status"] == "ready" else 503
+
+
+@routes.route("/dataset", methods=["GET"])
+@requires("dataset")
+def dataset():
+    state = _state()
+    response = current_app.response_class(state.dataset_body, mimetype="application/json")
+    response.set_etag(state.dataset_etag)
+    response.headers["Cache-Control"] = "public, no-cache"  # Cache, but revalidate via ETag
+    return response.make_conditional(request)
+
+
+@routes.route("/points", methods=["GET"])
+@requires("dataset")
+def points():
+    """
+    Ids of the points to draw for one view (see lod.py): at most `budget`
+    representatives inside `bounds` ("x0,y0,z0,x1,y1,z1", default: everything),
+    plus the `include` ids (comma-separated, e.g. a traversal path).
+    """
+    snapshot = _state().snapshot
+    budget = min(max(request.args.get("budget", 5000, type=int), 1), 200000)
+    try:
+        bounds = [float(v) for v in request.args["bounds"].split(",")] if request.args.get("bounds") else None
+        include = [int(v) for v in request.args["include"].split(",")] if request.args.get("include") else None
+    except ValueError:
+        return jsonify({"error": "'bounds' and 'include' must be comma-separated numbers"}), 400
+    if bounds is not None and len(bounds) != 6:
+        return jsonify({"error": "'bounds' needs 6 values: x0,y0,z0,x1,y1,z1"}), 400
+    if include is not None and not all(0 <= i < len(snapshot.texts) for i in include):
+        return jsonify({"error": "'include' ids out of range"}), 400
+
+    ids, counts, level = snapshot.lod.select(budget, bounds=bounds, include=include)
+    return jsonify({
+        "dataset_id": snapshot.dataset_etag,
+        "level": level,
+        "ids": b64_array(ids, "<i4"),        # Int32Array
+        "counts": b64_array(counts, "<i4")   # Int32Array, points each id stands for
+    })
+
+
+@routes.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_from_directory(current_app.static_folder, 'index.html')
 
-@app.route('/<path:path>')
+@routes.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory(app.static_folder, path)
+    return send_from_directory(current_app.static_folder, path)
 
 
-@app.route("/query", methods=["POST"])
+@routes.route("/query", methods=["POST"])
+@requires("dataset")
 def query():
+    state = _state()
+    snapshot = state.snapshot
+    hnsw_index, acorn_index, texts, vectors, pca_3d = (
+        snapshot.hnsw_index, snapshot.acorn_index, snapshot.texts, snapshot.vectors, snapshot.pca_3d
+    )
     try:
         data = request.get_json()
         word = data.get("word", "")
+        try:
+            k, ef_search = _search_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        trace = QueryTrace() if INSTRUMENT_QUERIES or data.get("instrument") else None
+
+        # Optional predicate for ACORN-1, e.g. {"frequency_rank": {"lt": 1000}}
+        filter_mask = None
+        if data.get("filter"):
+            try:
+                filter_mask = acorn_index.filter_mask(data["filter"])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if not filter_mask.any():
+                return jsonify({"error": "No words match the filter"}), 400
 
         query_vector, actual_word, query_idx = get_query_embedding(
-            word, model, vectors, texts, sbert_to_glove_pca
+            word, state.model, vectors, texts, state.sbert_to_glove_pca, word_index=snapshot.word_index,
+            cache=state.query_cache, trace=trace
         )
 
 
-        # HNSW Search
-        start_hnsw = time.time()
-        hnsw_result, hnsw_log, entry_node = hnsw_index.search(query_vector)
-        end_hnsw = time.time()
+        # Every compared algorithm searches concurrently; ACORN-1 starts from the HNSW entry point
+        entry_node = hnsw_index.entry_point
+        results = _search_all(snapshot.ann, query_vector, pool=state.search_pool,
+                              k=k, ef_search=ef_search, trace=trace, filter=filter_mask)
+
+        # Out-of-vocabulary words resolve to their closest GloVe word, so the query always has a position
+        query_3d = pca_3d[query_idx].tolist()
+
 
-        # ACORN-1 Search
-        start_acorn = time.time()
-        acorn_result, acorn_path, _ = acorn_index.search(query_vector, start_node=entry_node)
-        end_acorn = time.time()
+        state.search_log.append({
+            "word": actual_word,
+            **{name: _log_row(result, time_ms, query_vector, vectors) for name, (result, time_ms) in results.items()}
+        })
 
-        # Reduce query vector to 3D
-        if query_idx >= 0:
-            query_3d = pca_3d[query_idx].tolist()
-        else:
-            query_3d = query_vector.tolist()  # show this floating query vector
 
+        # Labels, positions, layers and ACORN-1 neighbors come from /dataset
+        with phase(trace, "serialization"):
+            response = {
+                "dataset_id": snapshot.dataset_etag,
+                "query": actual_word,
+                "query_coords": query_3d,
 
-        # Visited nodes
-        visited_nodes = set([i for path in hnsw_log.values() for i in path] + acorn_path)
-        node_positions = {
-            str(i): pca_3d[i].tolist() for i in visited_nodes
-        }
+                "hnsw_entry_node": entry_node,
+                "hnsw_entry_coords": pca_3d[entry_node].tolist(),
 
-        # Layer assignment for nodes
-        layer_assignments = {
-            str(n): layer for layer, nodes in hnsw_index.layers.items() for n in nodes
-        }
+                "pca_info": {
+                    "retained": round(snapshot.retained_variance * 100, 2),
+                    "loss": round((1 - snapshot.retained_variance) * 100, 2)
+                },
 
-        search_log.append({
-            "word": actual_word,
-            "hnsw": {
-                "time_ms": round((end_hnsw - start_hnsw) * 1000, 2),
-                "steps": int(sum(len(v) for v in hnsw_log.values())),
-                "sim": float(compute_cosine_similarity(query_vector, np.atleast_2d(vectors[int(hnsw_result)]))[0])
-            },
-            "acorn": {
-                "time_ms": round((end_acorn - start_acorn) * 1000, 2),
-                "steps": int(len(acorn_path)),
-                "sim": float(compute_cosine_similarity(query_vector, np.atleast_2d(vectors[int(acorn_result)]))[0])
+                "algorithms": [{"name": name, "label": index.label} for name, index in snapshot.ann.items()]
             }
-        })
+            for name, (result, time_ms) in results.items():
+                best = result.top_k[0][0]
+                response[name] = {
+                    "result": texts[int(best)],
+                    "path": result.path,
+                    "time_ms": round(time_ms, 2),
+                    "num_visited": int(result.steps),
+                    "similarity": _similarity(query_vector, vectors, best),
+                    "top_k": [
+                        {"word": texts[int(n)], "similarity": round(1 - float(d), 4)} for n, d in result.top_k
+                    ],
+                    **result.extra
+                }
+                if filter_mask is not None and snapshot.ann[name].supports_filter:
+                    response[name]["filter"] = {
+                        "matches": int(np.count_nonzero(filter_mask)),
+                        "selectivity": round(float(filter_mask.mean()), 4),
+                        **snapshot.ann[name].describe_filter(filter_mask)
+                    }
+            body = json.dumps(response)
+        if trace is not None:
+            # Spliced in after the timed encoding, so the metrics include it
+            body = f'{body[:-1]}, "metrics": {json.dumps(trace.to_dict())}}}'
+            state.metrics.record("query", trace)
+        return current_app.response_class(body, mimetype="application/json")
 
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@routes.route("/batch_query", methods=["POST"])
+@requires("dataset")
+def batch_query():
+    """
+    Search a list of words with every compared algorithm in one call.
+    Out-of-vocabulary words are encoded together and each algorithm runs one
+    batched search, all of them concurrently.
+    """
+    state = _state()
+    snapshot = state.snapshot
+    texts, vectors = snapshot.texts, snapshot.vectors
+    try:
+        data = request.get_json()
+        words = data.get("words", [])
+        if not isinstance(words, list) or not words:
+            return jsonify({"error": "'words' must be a non-empty list"}), 400
+        if len(words) > MAX_BATCH_WORDS:
+            return jsonify({"error": f"'words' can hold at most {MAX_BATCH_WORDS} words"}), 400
+        if not all(isinstance(word, str) for word in words):
+            return jsonify({"error": "'words' must only contain strings"}), 400
+        try:
+            k, ef_search = _search_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        start = time.time()
+        query_vectors, actual_words, _ = get_query_embeddings(
+            words, state.model, vectors, texts, state.sbert_to_glove_pca, snapshot.word_index, cache=state.query_cache
+        )
+        embed_ms = (time.time() - start) * 1000
+
+        futures = {
+            name: state.search_pool.submit(_timed, index.search_batch, query_vectors, k=k, ef_search=ef_search)
+            for name, index in snapshot.ann.items()
+        }
+        found = {name: future.result() for name, future in futures.items()}
+
+        def top_k(ids, dists):
+            return [
+                {"word": texts[int(n)], "similarity": round(1 - float(d), 4)}
+                for n, d in zip(ids, dists) if n >= 0
+            ]
 
         return jsonify({
-            "query": actual_word,
-            "query_coords": query_3d,
-
-            "hnsw_entry_node": entry_node,
-            "hnsw_entry_coords": pca_3d[entry_node].tolist(),
-
-            "pca_info": {
-                "retained": round(retained_variance * 100, 2),
-                "loss": round((1 - retained_variance) * 100, 2)
-            },
-
-            "hnsw": {
-                "result": texts[int(hnsw_result)],
-                "path": {str(int(k)): [int(x) for x in v] for k, v in hnsw_log.items()},
-                "time_ms": round((end_hnsw - start_hnsw) * 1000, 2),
-                "num_visited": int(sum(len(v) for v in hnsw_log.values())),
-                "similarity": float(compute_cosine_similarity(query_vector, np.atleast_2d(vectors[int(hnsw_result)]))[0])
-            },
-
-            "acorn": {
-                "result": texts[int(acorn_result)],
-                "path": [int(x) for x in acorn_path],
-                "time_ms": round((end_acorn - start_acorn) * 1000, 2),
-                "num_visited": int(len(acorn_path)),
-                "similarity": float(compute_cosine_similarity(query_vector, np.atleast_2d(vectors[int(acorn_result)]))[0]),
-                "neighbors": {
-                    str(k): [int(n) for n in v]
-                    for k, v in acorn_index.acorn_graph.items()
+            "results": [
+                {
+                    "word": word,
+                    "query": actual,
+                    **{name: top_k(ids[i], dists[i]) for name, ((ids, dists), _) in found.items()}
                 }
-            },
-
-            "positions": {str(i): pca_3d[i].tolist() for i in range(len(vectors))},
-            "layers": layer_assignments,
-            "labels": {str(i): texts[i] for i in range(len(vectors))}
+                for i, (word, actual) in enumerate(zip(words, actual_words))
+            ],
+            "timing": {
+                "embed_ms": round(embed_ms, 2),
+                **{f"{name}_ms": round(ms, 2) for name, (_, ms) in found.items()},
+                **{f"{name}_qps": round(len(words) / max(ms / 1000, 1e-9), 1) for name, (_, ms) in found.items()}
+            }
         })
 
     except Exception as e:
@@ -150,43 +396,70 @@ def query():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
-@app.route("/summary", methods=["GET"])
+@routes.route("/summary", methods=["GET"])
+@requires("dataset")
 def summary():
+    state = _state()
+    snapshot = state.snapshot
+    texts, vectors = snapshot.texts, snapshot.vectors
     from random import sample
-    random_words = sample(texts, 10)
+    samples = min(max(request.args.get("samples", 10, type=int), 0), 100)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+    random_words = sample(texts, samples)
+
+    def sample_search(word):
+        query_vector, actual_word, idx = get_query_embedding(
+            word, state.model, vectors, texts, state.sbert_to_glove_pca, word_index=snapshot.word_index,
+            cache=state.query_cache
+        )
 
-    summary_data = []
+        # Run every algorithm's search
+        results = _search_all(snapshot.ann, query_vector, k=1)
+        return {
+            "word": actual_word,
+            **{name: _log_row(result, time_ms, query_vector, vectors) for name, (result, time_ms) in results.items()}
+        }
 
-    for word in random_words:
-        query_vector, actual_word, idx = get_query_embedding(word, model, vectors, texts, sbert_to_glove_pca)
+    # Samples are searched concurrently on the shared pool (algorithms in turn within a sample)
+    summary_data = list(state.search_pool.map(sample_search, random_words))
 
-        # Run both searches
-        h_start = time.time()
-        h_res, h_log, entry_node = hnsw_index.search(query_vector)
-        h_end = time.time()
+    # Aggregates cover every logged /query; entries page through the recent ones
+    return jsonify({
+        "aggregates": state.search_log.aggregates(),
+        "total": state.search_log.total,
+        "retained": len(state.search_log),
+        "offset": offset,
+        "limit": limit,
+        "entries": state.search_log.page(offset, limit),
+        "samples": summary_data,
+        "algorithms": [{"name": name, "label": index.label} for name, index in snapshot.ann.items()]
+    })
 
-        a_start = time.time()
-        a_res, a_path, _ = acorn_index.search(query_vector, start_node=entry_node)
-        a_end = time.time()
 
-        summary_data.append({
-            "word": actual_word,
-            "hnsw": {
-                "time_ms": round((h_end - h_start) * 1000, 2),
-                "steps": int(sum(len(v) for v in h_log.values())),
-                "sim": float(compute_cosine_similarity(query_vector, np.atleast_2d(vectors[int(h_res)]))[0])
-            },
-            "acorn": {
-                "time_ms": round((a_end - a_start) * 1000, 2),
-                "steps": int(len(a_path)),
-                "sim": float(compute_cosine_similarity(query_vector, np.atleast_2d(vectors[int(a_res)]))[0]),
-            }
-        })
+@routes.route("/algorithms", methods=["GET"])
+@requires("dataset")
+def algorithms():
+    """Build time, memory, distance evaluations and parameters of every compared algorithm."""
+    return jsonify({name: index.stats() for name, index in _state().snapshot.ann.items()})
+
+
+@routes.route("/sweep_results", methods=["GET"])
+def sweep_results():
+    if not os.path.exists(SWEEP_RESULTS_PATH):
+        return jsonify({"error": "No sweep results yet. Run `python sweep.py` first."}), 404
+    with open(SWEEP_RESULTS_PATH, "r", encoding="utf-8") as f:
+        return jsonify(json.load(f))
+
 
-    # Combine with user-searched words
-    full_report = search_log + summary_data
-    return jsonify(full_report)
+@routes.route("/metrics", methods=["GET"])
+def metrics_report():
+    """Aggregated instrumentation of traced queries (see instrumentation.py)."""
+    return jsonify({"enabled": INSTRUMENT_QUERIES, "endpoints": _state().metrics.snapshot()})
 
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5050)
\ No newline at end of file
+    # The debug reloader runs this file twice; only its child process (the server) loads
+    debug = True
+    serving = not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    create_app(start=serving).run(debug=debug, port=5050)
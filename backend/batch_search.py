@@ -0,0 +1,137 @@
+# batch_search.py
+import heapq
+
+import numpy as np
+
+# Upper bound on the per-chunk visited bitmap (queries x nodes booleans)
+VISITED_BYTES = 1 << 26
+
+
+def greedy_descend_batch(graph, data, queries, current):
+    """
+    Greedy hill-climbing of many queries on one graph layer, in lockstep.
+
+    Every round gathers the neighbors of all still-moving queries and scores
+    them in one vectorized pass; a query stops once no neighbor improves on it.
+
+    Args:
+        graph (CSRGraph): Layer adjacency
+        data (np.ndarray): Normalized vectors, shape (n_nodes, dim)
+        queries (np.ndarray): Normalized queries, shape (n_queries, dim)
+        current (np.ndarray): Start node per query
+
+    Returns:
+        np.ndarray: Local optimum per query
+    """
+    current = np.array(current, dtype=np.int64)
+    current_dist = 1 - np.einsum('ij,ij->i', data[current], queries)
+    active = np.arange(len(queries))
+
+    while len(active):
+        owner, neighbors = graph.gather(current[active])
+        if not len(neighbors):
+            break
+        dists = 1 - np.einsum('ij,ij->i', data[neighbors], queries[active[owner]])
+
+        # Best neighbor per query: first entry of each owner group after sorting by distance
+        order = np.lexsort((dists, owner))
+        first = order[np.flatnonzero(np.diff(owner[order], prepend=-1))]
+        movers = active[owner[first]]
+        improved = dists[first] < current_dist[movers]
+
+        movers = movers[improved]
+        current[movers] = neighbors[first[improved]]
+        current_dist[movers] = dists[first[improved]]
+        active = movers
+
+    return current
+
+
+def beam_search_batch(graph, data, queries, entries, ef, excluded=None):
+    """
+    Best-first (ef) search of many queries on one graph, in lockstep.
+
+    Each round expands the closest open candidate of every active query,
+    gathers all of their unvisited neighbors at once and scores them with a
+    single vectorized pass; only the heap updates stay per query. Queries are
+    processed in chunks so the visited bitmap stays under VISITED_BYTES.
+
+    Args:
+        graph (CSRGraph): Adjacency to search
+        data (np.ndarray): Normalized vectors, shape (n_nodes, dim)
+        queries (np.ndarray): Normalized queries, shape (n_queries, dim)
+        entries (np.ndarray): Start node per query
+        ef (int): Candidate list size
+        excluded (set, optional): Nodes that are traversed but never returned
+
+    Returns:
+        List[List[Tuple[float, int]]]: (distance, node) pairs per query, sorted by distance
+    """
+    num_nodes = len(data)
+    chunk = max(1, VISITED_BYTES // max(1, num_nodes))
+    results = []
+    for start in range(0, len(queries), chunk):
+        results.extend(_beam_search_chunk(
+            graph, data, queries[start:start + chunk], entries[start:start + chunk], ef, num_nodes
+        ))
+    if excluded:
+        results = [[(d, n) for d, n in found if n not in excluded] for found in results]
+    return results
+
+
+def _beam_search_chunk(graph, data, queries, entries, ef, num_nodes):
+    n_queries = len(queries)
+    visited = np.zeros((n_queries, num_nodes), dtype=bool)
+    rows = np.arange(n_queries)
+    entries = np.asarray(entries, dtype=np.int64)
+    visited[rows, entries] = True
+
+    entry_dists = (1 - np.einsum('ij,ij->i', data[entries], queries)).tolist()
+    candidates = [[(d, int(n))] for d, n in zip(entry_dists, entries)]
+    found = [[(-d, int(n))] for d, n in zip(entry_dists, entries)]
+    active = list(range(n_queries))
+
+    while active:
+        # Pop the closest open candidate of every active query
+        expand_queries, expand_nodes = [], []
+        for q in active:
+            if candidates[q]:
+                dist, node = heapq.heappop(candidates[q])
+                if dist <= -found[q][0][0]:
+                    expand_queries.append(q)
+                    expand_nodes.append(node)
+        if not expand_queries:
+            break
+        expand_queries = np.array(expand_queries)
+
+        owner, neighbors = graph.gather(np.array(expand_nodes))
+        owner_queries = expand_queries[owner]
+        fresh = ~visited[owner_queries, neighbors]
+        owner_queries, neighbors = owner_queries[fresh], neighbors[fresh]
+        visited[owner_queries, neighbors] = True
+        dists = 1 - np.einsum('ij,ij->i', data[neighbors], queries[owner_queries])
+
+        # Drop neighbors that cannot beat the current worst result of a full list
+        bound = np.array([-f[0][0] if len(f) >= ef else np.inf for f in found])
+        keep = dists < bound[owner_queries]
+        for q, n, d in zip(owner_queries[keep].tolist(), neighbors[keep].tolist(), dists[keep].tolist()):
+            if len(found[q]) < ef or d < -found[q][0][0]:
+                heapq.heappush(candidates[q], (d, n))
+                heapq.heappush(found[q], (-d, n))
+                if len(found[q]) > ef:
+                    heapq.heappop(found[q])
+
+        active = expand_queries.tolist()
+
+    return [sorted((-d, n) for d, n in f) for f in found]
+
+
+def pack_results(found, k):
+    """Turn per-query (distance, node) lists into padded (ids, distances) arrays of width k."""
+    ids = np.full((len(found), k), -1, dtype=np.int64)
+    dists = np.full((len(found), k), np.inf, dtype=np.float32)
+    for i, pairs in enumerate(found):
+        for j, (d, n) in enumerate(pairs[:k]):
+            ids[i, j] = n
+            dists[i, j] = d
+    return ids, dists
@@ -0,0 +1,168 @@
+# benchmark.py
+"""
+Headless recall / latency benchmark of the algorithms in ann_registry.py
+(HNSW, ACORN-1 and the exact flat baseline by default).
+
+Example:
+    python benchmark.py --glove glove.6B.100d.txt --max-words 20000 \
+        --queries 500 --k 10 --ef-search 10 20 50 --output-json bench.json --output-csv bench.csv
+"""
+import argparse
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ann_registry import ANN_REGISTRY, build_indexes
+from glove_loader import load_glove_embeddings
+from vector_ops import blocked_top_k, normalize_vectors
+
+
+def exact_ground_truth(data, queries, k):
+    """Exact top-k neighbor ids of every query by blocked brute-force matmul."""
+    ids, _ = blocked_top_k(queries, data, k, desc="Computing exact ground truth")
+    return ids
+
+
+def recall_at_k(found_ids, true_ids, k):
+    """Mean fraction of the true top-k that appears in the returned top-k."""
+    hits = [len(set(found[:k]) & set(true[:k])) for found, true in zip(found_ids, true_ids)]
+    return float(np.mean(hits)) / k
+
+
+def make_queries(data, num_queries, noise=0.0, seed=0):
+    """Sample dataset vectors as queries, optionally perturbed with Gaussian noise."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(data), size=min(num_queries, len(data)), replace=False)
+    queries = np.array(data[rows], dtype=np.float32)
+    if noise > 0:
+        queries += rng.normal(scale=noise, size=queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def benchmark_index(name, index, queries, true_ids, k, ef_search, search_kwargs=None):
+    """
+    Run every query through index.search (an ann_registry.ANNIndex) one at a time and summarize.
+
+    Returns:
+        dict: recall@k, latency percentiles, QPS and distance evaluations per query
+    """
+    search_kwargs = search_kwargs or {}
+    latencies = np.empty(len(queries))
+    found_ids = []
+    evals_before = index.distance_evals
+
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        result = index.search(query, k=k, ef_search=ef_search, **search_kwargs)
+        latencies[i] = time.perf_counter() - start
+        found_ids.append([node for node, _ in result.top_k])
+
+    distance_evals = index.distance_evals - evals_before
+
+    start = time.perf_counter()
+    index.search_batch(queries, k=k, ef_search=ef_search)
+    batch_time = time.perf_counter() - start
+
+    latencies_ms = latencies * 1000
+    return {
+        "algorithm": name,
+        "ef_search": ef_search,
+        "k": k,
+        "recall_at_k": round(recall_at_k(found_ids, true_ids, k), 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 4),
+        "qps": round(len(queries) / latencies.sum(), 1),
+        "batch_qps": round(len(queries) / batch_time, 1),
+        "distance_evals_per_query": round(distance_evals / len(queries), 1),
+    }
+
+
+def write_csv(path, rows, extra=None):
+    extra = extra or {}
+    fieldnames = list(extra) + list(rows[0])
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**extra, **row})
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark of the registered ANN algorithms")
+    parser.add_argument("--glove", default="glove.6B.100d.txt", help="GloVe .txt file")
+    parser.add_argument("--max-words", type=int, default=2500, help="Index the first N words")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--noise", type=float, default=0.0, help="Gaussian noise added to the query vectors")
+    parser.add_argument("--k", type=int, default=10, help="Neighbors per query for recall@k")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50], help="ef_search values to try")
+    parser.add_argument("--M", type=int, default=10)
+    parser.add_argument("--middle-ratio", type=float, default=0.1)
+    parser.add_argument("--entry-ratio", type=float, default=0.1)
+    parser.add_argument("--build", choices=["incremental", "bulk"], default="incremental")
+    parser.add_argument("--radius", type=float, default=0.5)
+    parser.add_argument("--max-neighbors", type=int, default=20)
+    parser.add_argument("--algorithms", nargs="+", choices=list(ANN_REGISTRY), default=list(ANN_REGISTRY),
+                        help="Registered algorithms to compare")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Benchmark the algorithms concurrently (latencies then include contention)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-json", help="Write the full report as JSON")
+    parser.add_argument("--output-csv", help="Write one row per (algorithm, ef_search) as CSV")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    texts, vectors = load_glove_embeddings(args.glove, max_words=args.max_words)
+    vectors = normalize_vectors(vectors)
+
+    indexes = build_indexes(vectors, args.algorithms, params={
+        "hnsw": {"M": args.M, "middle_ratio": args.middle_ratio, "entry_ratio": args.entry_ratio,
+                 "build": args.build, "seed": args.seed},
+        "acorn": {"radius": args.radius, "max_neighbors": args.max_neighbors},
+    })
+
+    queries = make_queries(vectors, args.queries, noise=args.noise, seed=args.seed)
+    true_ids = exact_ground_truth(vectors, queries, args.k)
+
+    def run(name):
+        return [benchmark_index(name, indexes[name], queries, true_ids, args.k, ef_search)
+                for ef_search in args.ef_search]
+
+    if args.parallel:
+        with ThreadPoolExecutor(max_workers=len(indexes)) as pool:
+            rows = list(pool.map(run, indexes))
+    else:
+        rows = [run(name) for name in indexes]
+    # Grouped by ef_search, then algorithm
+    results = sorted((row for algorithm_rows in rows for row in algorithm_rows),
+                     key=lambda row: args.ef_search.index(row["ef_search"]))
+
+    report = {
+        "config": vars(args),
+        "num_vectors": len(vectors),
+        "build": {name: index.stats() for name, index in indexes.items()},
+        "results": results,
+    }
+
+    print(f"\n{'algorithm':<8} {'ef':>5} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'qps':>9} {'dist/q':>8}")
+    for row in results:
+        print(f"{row['algorithm']:<8} {row['ef_search']:>5} {row['recall_at_k']:>10.4f} {row['p50_ms']:>8.3f} "
+              f"{row['p99_ms']:>8.3f} {row['qps']:>9.1f} {row['distance_evals_per_query']:>8.1f}")
+
+    if args.output_json:
+        with open(args.output_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.output_csv:
+        write_csv(args.output_csv, results, extra={"num_vectors": len(vectors), "M": args.M})
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+# csr_graph.py
+import heapq
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class CSRGraph:
+    """
+    Adjacency lists stored as flat int32 arrays (compressed sparse rows).
+
+    Row i lives in indices[start[i] : start[i] + degree[i]]. A freshly built
+    graph is plain CSR (start == indptr[:-1], no slack). Rows can reserve
+    spare capacity so that an index that grows online can append links in
+    place; a row that outgrows its capacity is moved to the end of the arrays.
+    """
+
+    def __init__(self, indptr, indices):
+        indptr = np.asarray(indptr, dtype=np.int64)
+        self.num_nodes = len(indptr) - 1
+        self._start = indptr[:-1].copy()
+        self._degree = np.diff(indptr).astype(np.int32)
+        self._capacity = self._degree.copy()
+        self._indices = indices  # Kept as given so memory-mapped arrays stay mapped
+        self._used = int(indptr[-1])
+
+    @classmethod
+    def empty(cls, num_nodes=0):
+        return cls(np.zeros(num_nodes + 1, dtype=np.int64), np.empty(0, dtype=np.int32))
+
+    @classmethod
+    def from_edges(cls, src, dst, num_nodes):
+        """Build from parallel arrays of directed edges src[i] -> dst[i]."""
+        order = np.argsort(src, kind="stable")
+        counts = np.bincount(src, minlength=num_nodes)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        return cls(indptr, np.asarray(dst)[order].astype(np.int32))
+
+    # ========== Reads ==========
+
+    def neighbors(self, node):
+        """Neighbors of node as an int32 array view."""
+        start = self._start[node]
+        return self._indices[start:start + self._degree[node]]
+
+    def get(self, node, default=()):
+        if 0 <= node < self.num_nodes:
+            return self.neighbors(node)
+        return default
+
+    __getitem__ = neighbors
+
+    def items(self):
+        """(node, neighbors) for every node that has at least one edge."""
+        for node in np.flatnonzero(self._degree[:self.num_nodes]):
+            yield int(node), self.neighbors(node)
+
+    def gather(self, nodes):
+        """
+        Neighbors of many nodes at once.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (owner, neighbors) where neighbors is
+            the concatenation of every node's list and owner[i] is the position
+            in `nodes` that neighbors[i] belongs to
+        """
+        nodes = np.asarray(nodes)
+        degrees = self._degree[nodes].astype(np.int64)
+        owner = np.repeat(np.arange(len(nodes)), degrees)
+        offsets = np.arange(degrees.sum()) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+        return owner, self._indices[np.repeat(self._start[nodes], degrees) + offsets]
+
+    def degree(self, node):
+        return int(self._degree[node])
+
+    @property
+    def num_edges(self):
+        return int(self._degree[:self.num_nodes].sum())
+
+    @property
+    def nbytes(self):
+        return int(self._start.nbytes + self._degree.nbytes + self._capacity.nbytes + self._indices.nbytes)
+
+    def to_csr(self):
+        """
+        Compact (indptr, indices) arrays without slack, in row order.
+        """
+        degree = self._degree[:self.num_nodes].astype(np.int64)
+        indptr = np.concatenate([[0], np.cumsum(degree)])
+        if np.array_equal(self._start[:self.num_nodes], indptr[:-1]) and self._used == indptr[-1]:
+            return indptr, self._indices[:indptr[-1]]
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        for node in np.flatnonzero(degree):
+            indices[indptr[node]:indptr[node + 1]] = self.neighbors(node)
+        return indptr, indices
+
+    # ========== Writes ==========
+
+    def add_node(self, capacity=0):
+        """Append an empty row that can hold `capacity` links without moving. Returns its id."""
+        node = self.num_nodes
+        if node == len(self._start):
+            size = max(16, 2 * len(self._start))
+            self._start = _grow(self._start, size)
+            self._degree = _grow(self._degree, size)
+            self._capacity = _grow(self._capacity, size)
+        self._start[node] = self._reserve(capacity)
+        self._degree[node] = 0
+        self._capacity[node] = capacity
+        self.num_nodes += 1
+        return node
+
+    def set_neighbors(self, node, neighbors):
+        """Replace the neighbor list of node, moving the row if it no longer fits."""
+        neighbors = np.asarray(neighbors, dtype=np.int32)
+        if len(neighbors) > self._capacity[node]:
+            start = self._reserve(len(neighbors))
+            self._indices[start:start + len(neighbors)] = neighbors
+            self._capacity[node] = len(neighbors)
+            self._start[node] = start
+        else:
+            start = self._start[node]
+            self._indices[start:start + len(neighbors)] = neighbors
+        self._degree[node] = len(neighbors)
+
+    def _reserve(self, size):
+        start = self._used
+        if start + size > len(self._indices):
+            self._indices = _grow(self._indices, max(start + size, 2 * len(self._indices), 64))
+        self._used += size
+        return start
+
+
+def _grow(array, size):
+    grown = np.zeros(size, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class VisitedTable:
+    """
+    Epoch-stamped visited set: a node is visited when marks[node] == epoch.
+
+    Starting a new search only bumps the epoch instead of clearing the array.
+    """
+
+    def __init__(self, size=0):
+        self.marks = np.zeros(size, dtype=np.uint32)
+        self.epoch = 0
+
+    def reset(self, size):
+        """Start a new search over `size` nodes and return the current epoch."""
+        if size > len(self.marks):
+            self.marks = np.zeros(max(size, 2 * len(self.marks)), dtype=np.uint32)
+            self.epoch = 0
+        self.epoch += 1
+        if self.epoch == np.iinfo(np.uint32).max:
+            self.marks[:] = 0
+            self.epoch = 1
+        return self.epoch
+
+
+def thread_visited_table(local):
+    """Return the VisitedTable kept on a threading.local, creating it on first use."""
+    table = getattr(local, "table", None)
+    if table is None:
+        table = local.table = VisitedTable()
+    return table
+
+
+def best_first_search(graph, score, entries, ef, marks, epoch, mask=None, expanded=None):
+    """
+    Best-first search of graph keeping the ef closest nodes found.
+
+    Each expansion scores all unvisited neighbors with one call to score.
+    Shared by the HNSW layer search and the ACORN-1 2-hop search.
+
+    Args:
+        graph (CSRGraph): Graph to traverse
+        score (callable): Maps an array of node ids to their distances
+        entries (List[int]): Start nodes
+        ef (int): Number of results kept
+        marks (np.ndarray): Visited marks (VisitedTable.marks), a node is visited when marks[node] == epoch
+        epoch (int): Current epoch of marks (VisitedTable.reset)
+        mask (np.ndarray, optional): Boolean per node. Only passing neighbors are
+            scored and expanded; entries failing it route the search but are never returned
+        expanded (list, optional): Every expanded node is appended to it, in order
+
+    Returns:
+        (List[Tuple[float, int]], int): (distance, node) pairs sorted by distance
+        and the number of neighbors scored (entries not included)
+    """
+    marks[entries] = epoch
+    candidates = [(float(d), int(n)) for d, n in zip(score(entries), entries)]
+    heapq.heapify(candidates)
+    results = [(-d, n) for d, n in candidates if mask is None or mask[n]]
+    heapq.heapify(results)
+    while len(results) > ef:
+        heapq.heappop(results)
+
+    scored = 0
+    while candidates:
+        dist, node = heapq.heappop(candidates)
+        if results and dist > -results[0][0]:
+            break
+        if expanded is not None:
+            expanded.append(node)
+
+        neighbors = graph.neighbors(node)
+        if mask is not None:
+            neighbors = neighbors[mask[neighbors]]
+        neighbors = neighbors[marks[neighbors] != epoch]
+        if not len(neighbors):
+            continue
+        marks[neighbors] = epoch
+        neighbor_dists = score(neighbors)
+        scored += len(neighbors)
+
+        # Only neighbors that beat the current worst result can enter the heaps
+        if len(results) >= ef:
+            keep = neighbor_dists < -results[0][0]
+            neighbors, neighbor_dists = neighbors[keep], neighbor_dists[keep]
+
+        for d, n in zip(neighbor_dists.tolist(), neighbors.tolist()):
+            if len(results) < ef or d < -results[0][0]:
+                heapq.heappush(candidates, (d, n))
+                heapq.heappush(results, (-d, n))
+                if len(results) > ef:
+                    heapq.heappop(results)
+
+    return sorted((-d, n) for d, n in results), scored
+
+
+class EvalCounter:
+    """Running count that several searching threads add to (e.g. distance evaluations)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def add(self, n):
+        with self._lock:
+            self.value += n
+
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer. A waiting writer blocks new
+    readers, so a stream of searches cannot starve inserts. Not reentrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
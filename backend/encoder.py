@@ -0,0 +1,95 @@
+# encoder.py
+"""
+Micro-batching front end for a sentence encoder.
+
+Concurrent requests each want one or a few sentences encoded; running every
+call as its own transformer forward pass wastes most of the batch capacity.
+MicroBatchEncoder queues the sentences and a single worker thread encodes
+them together, flushing when max_batch_size sentences are waiting or
+max_wait_ms after the first one arrived, whichever comes first.
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatchEncoder:
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5):
+        """
+        Parameters:
+        - model: Object with encode(List[str]) -> np.ndarray (e.g. a SentenceTransformer)
+        - max_batch_size: Most sentences encoded in one model.encode call
+        - max_wait_ms: Longest time the first sentence of a batch waits for company
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self.batches = 0    # model.encode calls made
+        self.sentences = 0  # sentences encoded
+        self._worker = threading.Thread(target=self._run, name="encoder", daemon=True)
+        self._worker.start()
+
+    def submit(self, sentence):
+        """Queue one sentence; the Future resolves to its embedding."""
+        future = Future()
+        self._queue.put((sentence, future))
+        return future
+
+    def encode(self, sentences, **kwargs):
+        """Drop-in for model.encode(sentences): blocks until every sentence is encoded."""
+        futures = [self.submit(sentence) for sentence in sentences]
+        return np.stack([future.result() for future in futures])
+
+    async def encode_async(self, sentence):
+        """Awaitable embedding of one sentence, for asyncio callers."""
+        return await asyncio.wrap_future(self.submit(sentence))
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Finish this batch, then stop
+                    break
+                batch.append(item)
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        sentences = [sentence for sentence, _ in batch]
+        try:
+            embeddings = self.model.encode(sentences)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.sentences += len(sentences)
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "sentences": self.sentences,
+            "mean_batch_size": round(self.sentences / self.batches, 2) if self.batches else 0,
+        }
@@ -1,38 +1,208 @@
 # glove_loader.py
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 from tqdm import tqdm
 
-def load_glove_embeddings(file_path, max_words=None):
+
+def cache_paths(file_path):
+    """
+    Return the paths of the binary cache that belongs to a GloVe text file.
+
+    The cache lives next to the source file:
+      <file>.vectors.npy : float32 matrix of shape (n_words, dim)
+      <file>.vocab.txt   : one word per line, same order as the matrix rows
+
+    Returns:
+        Tuple[str, str]: (vectors_path, vocab_path)
+    """
+    return file_path + ".vectors.npy", file_path + ".vocab.txt"
+
+
+def _cache_is_fresh(file_path):
+    vectors_path, vocab_path = cache_paths(file_path)
+    if not (os.path.exists(vectors_path) and os.path.exists(vocab_path)):
+        return False
+    if not os.path.exists(file_path):
+        return True  # Only the cache was shipped, nothing to compare against
+    source_mtime = os.path.getmtime(file_path)
+    return (os.path.getmtime(vectors_path) >= source_mtime
+            and os.path.getmtime(vocab_path) >= source_mtime)
+
+
+def convert_glove_to_binary(file_path, n_jobs=None, block_bytes=1 << 24):
+    """
+    One-time conversion of a GloVe .txt file into the binary cache.
+
+    The file is split into newline-aligned byte ranges that are parsed in a
+    process pool. Each worker converts whole blocks of lines at once with
+    `np.fromstring` and writes the rows straight into a preallocated .npy
+    memmap, so memory stays bounded by `block_bytes` per worker. The whole
+    vocabulary is parsed (ignoring any max_words limit) so that later loads
+    of any size can be served from the same cache. The workers are spawned,
+    so a calling script needs an `if __name__ == "__main__"` guard.
+
+    Args:
+        file_path (str): Path to the GloVe .txt file.
+        n_jobs (int, optional): Number of worker processes (default: all cores).
+        block_bytes (int): Approximate size of the text block parsed at once.
+
+    Returns:
+        Tuple[str, str]: (vectors_path, vocab_path) of the written cache
+    """
+    vectors_path, vocab_path = cache_paths(file_path)
+    n_jobs = n_jobs or os.cpu_count() or 1
+    ranges = _chunk_ranges(file_path, n_jobs * 4)
+
+    # Write to temporary names first so an interrupted conversion never
+    # leaves a half-written cache that looks fresh.
+    tmp_vectors = vectors_path + ".tmp.npy"
+    tmp_vocab = vocab_path + ".tmp"
+    try:
+        # Spawned, not forked: the server converts from a background thread while others run
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+            counts = list(pool.map(_count_rows, [(file_path, s, e, block_bytes) for s, e in ranges]))
+            num_rows = sum(n for n, _ in counts)
+            dims = {d for n, d in counts if n}
+            if len(dims) != 1:
+                raise ValueError(f"Inconsistent vector dimensions in {file_path}: {sorted(dims)}")
+            dim = dims.pop()
+
+            out = np.lib.format.open_memmap(tmp_vectors, mode='w+', dtype=np.float32, shape=(num_rows, dim))
+            del out  # Workers reopen the file; only the header had to be written here
+
+            offsets = np.concatenate([[0], np.cumsum([n for n, _ in counts])[:-1]])
+            futures = [
+                pool.submit(_parse_range, (file_path, s, e, int(row), tmp_vectors, dim, block_bytes))
+                for (s, e), row in zip(ranges, offsets)
+            ]
+            for _ in tqdm(as_completed(futures), total=len(futures), desc="Converting GloVe embeddings"):
+                pass
+            words = [w for fut in futures for w in fut.result()]
+
+        with open(tmp_vocab, 'w', encoding='utf-8') as f:
+            f.write("\n".join(words))
+            f.write("\n")
+        os.replace(tmp_vectors, vectors_path)
+        os.replace(tmp_vocab, vocab_path)
+    finally:
+        # Left behind only if a worker failed (malformed row, dimension mismatch)
+        for path in (tmp_vectors, tmp_vocab):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return vectors_path, vocab_path
+
+
+def _chunk_ranges(file_path, n_chunks):
+    """Split a file into at most n_chunks byte ranges that start on a line boundary."""
+    size = os.path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, n_chunks):
+            f.seek(size * i // n_chunks)
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _iter_line_blocks(file_path, start, end, block_bytes):
+    """Yield the non-empty lines of [start, end) in blocks of roughly block_bytes."""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            block = f.read(min(block_bytes, end - pos))
+            if not block.endswith(b'\n') and pos + len(block) < end:
+                block += f.readline()  # Finish the line that straddles the block edge
+            pos += len(block)
+            lines = [line for line in block.split(b'\n') if line.strip()]
+            if lines:
+                yield lines
+
+
+def _count_rows(args):
+    file_path, start, end, block_bytes = args
+    num_rows, dim = 0, None
+    for lines in _iter_line_blocks(file_path, start, end, block_bytes):
+        if dim is None:
+            dim = len(lines[0].rstrip().split(b' ')) - 1
+        num_rows += len(lines)
+    return num_rows, dim
+
+
+def _parse_range(args):
+    file_path, start, end, row, out_path, dim, block_bytes = args
+    out = np.load(out_path, mmap_mode='r+')
+    words = []
+    for lines in _iter_line_blocks(file_path, start, end, block_bytes):
+        split = [line.rstrip().split(b' ', 1) for line in lines]
+        values = np.fromstring(b'\n'.join(parts[1] for parts in split), sep=' ', dtype=np.float32)
+        if values.size != len(lines) * dim:
+            raise ValueError(f"Malformed line in {file_path} between bytes {start} and {end}")
+        out[row:row + len(lines)] = values.reshape(len(lines), dim)
+        words.extend(parts[0].decode('utf-8') for parts in split)
+        row += len(lines)
+    out.flush()
+    return words
+
+
+def load_glove_embeddings(file_path, max_words=None, use_cache=True):
     """
     Load GloVe embeddings from a file.
-    
+
+    The first call converts the text file into a binary cache (see
+    `cache_paths`). Later calls memory-map the cached float32 matrix, so
+    startup is near-instant and the pages are shared between processes.
+
     Args:
         file_path (str): Path to the GloVe .txt file.
         max_words (int, optional): Limit to first N words for faster testing.
-        
+        use_cache (bool): Read/write the binary cache. If False the text file
+            is converted in memory and nothing is written to disk.
+
     Returns:
-        Tuple[List[str], np.ndarray]: Words and their corresponding vectors
+        Tuple[List[str], np.ndarray]: Words and their corresponding vectors.
+        With the cache enabled the vectors are a read-only memmap; slicing by
+        max_words is a zero-copy view.
     """
+    vectors_path, vocab_path = cache_paths(file_path)
+
+    if not use_cache:
+        words, vectors = _parse_glove_text(file_path, max_words)
+    else:
+        if not _cache_is_fresh(file_path):
+            print(f"Building binary cache for {file_path}...")
+            convert_glove_to_binary(file_path)
+
+        vectors = np.load(vectors_path, mmap_mode='r')
+        with open(vocab_path, 'r', encoding='utf-8') as f:
+            words = f.read().split("\n")[:len(vectors)]
+
+        if max_words:
+            vectors = vectors[:max_words]
+            words = words[:max_words]
+
+    print(len(words), vectors.shape)
+    return words, vectors
+
+
+def _parse_glove_text(file_path, max_words=None):
     words = []
     vectors = []
 
     with open(file_path, 'r', encoding='utf-8') as f:
-        for i, line in tqdm(enumerate(f), desc="Loading GloVe embeddings", total=max_words or 0):
+        for i, line in tqdm(enumerate(f), desc="Loading GloVe embeddings", total=max_words):
             if max_words and i >= max_words:
                 break
-            parts = line.strip().split()
+            parts = line.rstrip().split(' ')
             if len(parts) < 2:
                 continue
-            word = parts[0]
-            vector = np.array(parts[1:], dtype=np.float32)
-            words.append(word)
-            vectors.append(vector)
-
-    print(1)
-    vectors = np.vstack(vectors)
+            words.append(parts[0])
+            vectors.append(np.array(parts[1:], dtype=np.float32))
 
-    print(2)
-
-    print(len(words), vectors.shape)
-    #return None, None
-    return words, vectors
+    return words, np.vstack(vectors)
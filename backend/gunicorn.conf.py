@@ -0,0 +1,31 @@
+# gunicorn.conf.py
+"""
+Multi-worker serving with one shared copy of the index.
+
+    cd backend
+    gunicorn -c gunicorn.conf.py
+
+The master process builds (or verifies) the GloVe cache, the 3D projection and
+the HNSW / ACORN-1 indexes once, before forking (on_starting), then releases
+them and stops its threads, so workers fork from a small process. Each worker
+then memory-maps those files read-only (create_app(attach=True)), so the
+vectors, positions and CSR graphs sit once in the OS page cache no matter how
+many workers run. Per-worker memory is the word list, the /dataset payload
+and, after the first out-of-vocabulary query, the SBERT model.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "app:create_app(attach=True)"
+bind = os.environ.get("BIND", "0.0.0.0:5050")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Each worker loads in the background and reports readiness at /health
+preload_app = False
+timeout = 120
+
+
+def on_starting(server):
+    from tqdm import tqdm
+    tqdm.monitor_interval = 0  # Build progress bars start no monitor thread in the master
+    from app import publish_artifacts
+    publish_artifacts()
@@ -1,96 +1,572 @@
-import numpy as np
 import random
-from collections import defaultdict
-from joblib import Parallel, delayed
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+import time
+import uuid
+
+import numpy as np
+from threadpoolctl import threadpool_limits
 from tqdm import tqdm
 
+from batch_search import beam_search_batch, greedy_descend_batch, pack_results
+from csr_graph import CSRGraph, EvalCounter, ReadWriteLock, best_first_search, thread_visited_table
+from index_io import load_index_dir, save_index_dir
+from quantization import fit_quantizer, load_quantizer
+from vector_ops import blocked_top_k, vector_checksum
+
 
 class CompleteHNSW:
-    def __init__(self, data, M=10, middle_ratio=0.1, entry_ratio=0.1, n_jobs=-1):
-        self.data = np.array(data, dtype=np.float32)
-        self.data /= np.linalg.norm(self.data, axis=1, keepdims=True)  # Normalize for cosine
+    def __init__(self, data, M=10, middle_ratio=0.1, entry_ratio=0.1, n_jobs=-1, block_size=None,
+                 build="incremental", ef_construction=100, M0=None, labels=None, ef_search=10, seed=None,
+                 knn=None, quantization=None, pq_subspaces=None):
+        """
+        Hierarchical Navigable Small World index over cosine similarity.
+
+        Parameters:
+        - data: (n_samples, n_features) vectors, normalized internally
+        - M: Neighbors per node on the upper layers (and the bulk top-M graph)
+        - middle_ratio: Fraction of nodes that reach layer 1
+        - entry_ratio: Fraction of the nodes of a layer >= 1 that also reach the next layer
+        - n_jobs: Number of BLAS threads used by the bulk builder (-1 = all cores)
+        - block_size: Rows per similarity tile in the bulk builder (None = sized automatically)
+        - build: "incremental" inserts nodes one by one with the HNSW algorithm,
+                 "bulk" samples three layers and links each with an exact top-M graph
+        - ef_construction: Candidate list size used while inserting
+        - M0: Maximum neighbors per node on layer 0 (default: 2 * M)
+        - labels: Optional label per row of data, kept in self.labels
+        - ef_search: Default candidate list size of the layer-0 beam search
+        - seed: Seed for level sampling / layer selection, for reproducible builds
+        - knn: Optional precomputed exact neighbor ids of data, shape (n, K >= M), sorted by
+               similarity without self (blocked_top_k(..., exclude_self=True)); the bulk
+               builder reuses it for layer 0 instead of recomputing it
+        - quantization: None, "sq8" or "pq". Searches then traverse the graph on the
+                        compressed codes and re-rank the final candidates with float32
+        - pq_subspaces: Number of PQ subspaces; must divide dim
+                        (default: quantization.default_subspaces(dim))
+        """
+        data = np.asarray(data)
+        if quantization == "pq" and pq_subspaces and data.shape[1] % pq_subspaces:
+            # Checked before the build, which can take minutes
+            raise ValueError(f"pq_subspaces={pq_subspaces} does not divide the vector dimension {data.shape[1]}.")
+        self.source_checksum = vector_checksum(data)
+        self.build_id = uuid.uuid4().hex  # Lets a saved ACORN-1 index check it was built on this graph
+        data = np.array(data, dtype=np.float32)
+        data /= np.linalg.norm(data, axis=1, keepdims=True)  # Normalize for cosine
 
-        self.num_nodes = len(self.data)
         self.M = M
-        self.n_jobs = n_jobs  # Number of parallel jobs (CPU cores)
+        self.M0 = M0 or 2 * M
+        self.middle_ratio = middle_ratio
+        self.entry_ratio = entry_ratio
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.n_jobs = n_jobs
+        self.block_size = block_size
+        self.build = build
+        self.seed = seed
+        self._rng = random.Random(seed)
+
+        self.layers = {}
+        self.graphs = {}
+        self.entry_point = None
+        self.deleted = set()  # Tombstoned nodes: still routed through, never returned
+        self.quantizer = None
+        self.build_distance_evals = 0  # Vectors scored by inserts, kept apart from distance_evals
+        self._init_runtime_state()
+
+        start = time.perf_counter()
+        if build == "bulk":
+            self._data = data
+            self.num_nodes = len(data)
+            self.labels = list(labels) if labels is not None else [None] * self.num_nodes
+            self._build_bulk(knn)
+        elif build == "incremental":
+            self._data = np.empty_like(data)
+            self.num_nodes = 0
+            self.labels = []
+            for i in tqdm(range(len(data)), desc="⏳ Inserting nodes"):
+                self.insert(data[i], None if labels is None else labels[i])
+        else:
+            raise ValueError(f"Unknown build mode '{build}', expected 'incremental' or 'bulk'.")
+        if quantization is not None:
+            self.quantize(quantization, subspaces=pq_subspaces)
+        self.build_time_s = time.perf_counter() - start
+
+    def _init_runtime_state(self):
+        # Searches share the read side; insert / delete take the write side, so a
+        # search never sees a half-linked node or a buffer grown under it
+        self._rw_lock = ReadWriteLock()
+        self._visited = threading.local()  # One VisitedTable per searching thread
+        self._search_evals = EvalCounter()  # Vectors scored by searches, from any thread
+
+    @property
+    def params(self):
+        """Build parameters, as stored in saved indexes."""
+        return {
+            "M": self.M, "M0": self.M0, "middle_ratio": self.middle_ratio,
+            "entry_ratio": self.entry_ratio, "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search, "build": self.build, "seed": self.seed,
+            "quantization": self.quantizer.kind if self.quantizer is not None else None,
+            "pq_subspaces": getattr(self.quantizer, "subspaces", None),
+        }
+
+    @property
+    def distance_evals(self):
+        """Running count of vectors scored by searches."""
+        return self._search_evals.value
+
+    @property
+    def data(self):
+        """Normalized vectors of all inserted nodes (a view of the growable buffer)."""
+        return self._data[:self.num_nodes]
+
+    @property
+    def max_level(self):
+        return max(self.layers) if self.layers else -1
+
+    @property
+    def num_edges(self):
+        return sum(graph.num_edges for graph in self.graphs.values())
+
+    @property
+    def nbytes(self):
+        """Memory held by the vectors, all layer graphs and the compressed codes."""
+        quantized = self.quantizer.nbytes if self.quantizer is not None else 0
+        return int(self.data.nbytes + quantized + sum(graph.nbytes for graph in self.graphs.values()))
+
+    def _max_links(self, layer):
+        return self.M0 if layer == 0 else self.M
+
+    # ========== Bulk construction ==========
 
+    def _build_bulk(self, knn=None):
         # Build hierarchical layers
         all_indices = list(range(self.num_nodes))
         self.layers = {
             0: all_indices,
-            1: random.sample(all_indices, max(1, round(self.num_nodes * middle_ratio)))
+            1: self._rng.sample(all_indices, max(1, round(self.num_nodes * self.middle_ratio)))
         }
-        self.layers[2] = random.sample(
-            self.layers[1], max(1, round(len(self.layers[1]) * entry_ratio))
+        self.layers[2] = self._rng.sample(
+            self.layers[1], max(1, round(len(self.layers[1]) * self.entry_ratio))
         )
 
         if not self.layers[2]:
             raise ValueError("Entry layer is empty! Increase entry_ratio or middle_ratio.")
 
-        # Build graph for each layer in parallel
-        self.graphs = {}
         for layer, indices in self.layers.items():
             print(f"⏳ Building graph for layer {layer} with {len(indices)} nodes...")
-            graph = self._build_layer_graph(indices)
-            self.graphs[layer] = graph
+            self.graphs[layer] = self._build_layer_graph(indices, knn if layer == 0 else None)
 
         # Randomly select entry point from top layer
-        self.entry_point = random.choice(self.layers[2])
+        self.entry_point = self._rng.choice(self.layers[2])
 
-    def _build_layer_graph(self, indices):
-        """Builds a bidirectional graph for one layer using cosine similarity and parallelism."""
-        data_layer = self.data[indices]
+    def _build_layer_graph(self, indices, knn=None):
+        """
+        Builds a bidirectional top-M CSR graph for one layer with tiled matrix
+        multiplies. knn, if given, holds the exact neighbors of `indices`
+        (local ids) and skips the matmuls.
+        """
+        indices = np.asarray(indices)
+        n = len(indices)
 
-        def process_node(i):
-            vec_i = data_layer[i].reshape(1, -1)
-            sims = cosine_similarity(vec_i, data_layer)[0]
-            sims[i] = -1  # Exclude self
-            top_k = np.argpartition(sims, -self.M)[-self.M:]
-            return i, top_k.tolist()
+        if knn is not None:
+            local_neighbors = np.asarray(knn)[:, :self.M]
+        else:
+            data_layer = self.data[indices]
+            limits = None if self.n_jobs in (None, -1) else self.n_jobs
+            with threadpool_limits(limits=limits):
+                local_neighbors, _ = blocked_top_k(
+                    data_layer, data_layer, self.M, block_size=self.block_size,
+                    exclude_self=True, desc="  ↳ Connecting nodes"
+                )
 
-        results = Parallel(n_jobs=self.n_jobs)(
-            delayed(process_node)(i) for i in tqdm(range(len(indices)), desc="  ↳ Connecting nodes", leave=False)
-        )
+        # Symmetrize the kNN edges and drop duplicates in one vectorized pass
+        src = np.repeat(np.arange(n, dtype=np.int64), local_neighbors.shape[1])
+        dst = local_neighbors.ravel().astype(np.int64)
+        edges = np.unique(np.concatenate([src * n + dst, dst * n + src]))
+        src, dst = np.divmod(edges, n)
+        return CSRGraph.from_edges(indices[src], indices[dst], self.num_nodes)
+
+    # ========== Persistence ==========
+
+    def save(self, path):
+        """
+        Save the index as a directory of .npy arrays plus a versioned manifest
+        (layer membership, CSR adjacency per layer, vectors, entry point, build
+        parameters, the build id and the checksum of the source vectors).
+        """
+        arrays = {"data": self.data, "deleted": np.array(sorted(self.deleted), dtype=np.int64)}
+        if self.quantizer is not None:
+            arrays.update({f"quant_{name}": array for name, array in self.quantizer.to_arrays().items()})
+        for layer, graph in self.graphs.items():
+            arrays[f"layer{layer}_nodes"] = np.asarray(self.layers[layer], dtype=np.int32)
+            arrays[f"layer{layer}_indptr"], arrays[f"layer{layer}_indices"] = graph.to_csr()
+
+        manifest = {
+            "params": self.params,
+            "num_nodes": self.num_nodes,
+            "entry_point": self.entry_point,
+            "levels": sorted(self.graphs),
+            "source_checksum": self.source_checksum,
+            "build_id": self.build_id,
+            "build_time_s": self.build_time_s,
+            "build_distance_evals": self.build_distance_evals,
+            "labels": self.labels if any(label is not None for label in self.labels) else None,
+            "quantizer": self.quantizer.config if self.quantizer is not None else None,
+        }
+        save_index_dir(path, "hnsw", manifest, arrays)
+
+    @classmethod
+    def load(cls, path, mmap=True, expected_checksum=None, data=None):
+        """
+        Load an index written by save().
+
+        With mmap=True the vectors and adjacency arrays are memory-mapped
+        read-only, so processes loading the same files share their pages; such
+        an index can be searched but not modified. A quantized index then only
+        touches the float32 vectors to re-rank final candidates. Pass expected_checksum
+        (see vector_ops.vector_checksum) to reject an index built from
+        different source vectors. Pass data (num_nodes normalized rows, e.g. a
+        slice of a larger memory-mapped array) to search those instead of the
+        saved vectors.
+        """
+        manifest, arrays = load_index_dir(path, "hnsw", mmap=mmap)
+        if expected_checksum is not None and manifest["source_checksum"] != expected_checksum:
+            raise ValueError(f"Index at {path} was built from different vectors.")
+
+        params = manifest["params"]
+        index = cls.__new__(cls)
+        for name in ("M", "M0", "middle_ratio", "entry_ratio", "ef_construction", "ef_search", "build", "seed"):
+            setattr(index, name, params[name])
+        index.n_jobs = -1
+        index.block_size = None
+        index._rng = random.Random(params["seed"])
+
+        index.num_nodes = manifest["num_nodes"]
+        if data is not None and len(data) != index.num_nodes:
+            raise ValueError(f"Index at {path} has {index.num_nodes} nodes, got {len(data)} vectors.")
+        index._data = arrays["data"] if data is None else data
+        index.labels = manifest["labels"] or [None] * index.num_nodes
+        index.entry_point = manifest["entry_point"]
+        index.deleted = set(arrays["deleted"].tolist())
+        index.layers = {}
+        index.graphs = {}
+        for layer in manifest["levels"]:
+            index.layers[layer] = arrays[f"layer{layer}_nodes"].tolist()
+            index.graphs[layer] = CSRGraph(arrays[f"layer{layer}_indptr"], arrays[f"layer{layer}_indices"])
+        index.quantizer = None
+        if manifest.get("quantizer"):
+            index.quantizer = load_quantizer(manifest["quantizer"], {
+                name[len("quant_"):]: array for name, array in arrays.items() if name.startswith("quant_")
+            })
+        index.source_checksum = manifest["source_checksum"]
+        index.build_id = manifest.get("build_id")
+        index.build_time_s = manifest["build_time_s"]
+        index.build_distance_evals = manifest.get("build_distance_evals", 0)
+        index._init_runtime_state()
+        return index
+
+    # ========== Incremental construction ==========
+
+    def _sample_level(self):
+        """
+        Draw the top layer of a new node.
+
+        A node reaches layer 1 with probability middle_ratio and every further
+        layer with probability entry_ratio. This is the exponential HNSW level
+        distribution floor(-ln(U) * mL) with mL = 1 / ln(1 / ratio); for
+        ratio = 1 / M it matches the paper's default mL = 1 / ln(M).
+        """
+        level = 0
+        p = self.middle_ratio
+        while self._rng.random() < p:
+            level += 1
+            p = self.entry_ratio
+        return level
+
+    def insert(self, vector, label=None):
+        """
+        Insert one vector following the HNSW algorithm (Malkov & Yashunin, Alg. 1).
+
+        Online growth is HNSW-only: an ACORN1 built on this index keeps the
+        nodes and entry point it was built with, so new nodes are searchable
+        through ACORN-1 once it is rebuilt.
+
+        Returns:
+            int: Id of the new node
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / np.linalg.norm(vector)
+
+        with self._rw_lock.write():
+            node = self._append_vector(vector, label)
+            if self.quantizer is not None:
+                self.quantizer.append(vector)
+            level = self._sample_level()
+            top = self.max_level
 
-        graph = defaultdict(set)
-        index_map = {local_idx: global_idx for local_idx, global_idx in enumerate(indices)}
+            for layer in range(max(top, level) + 1):
+                if layer not in self.graphs:
+                    self.graphs[layer] = CSRGraph.empty(node)
+                self.graphs[layer].add_node(self._max_links(layer) if layer <= level else 0)
+            for layer in range(level + 1):
+                self.layers.setdefault(layer, []).append(node)
 
-        for local_i, neighbor_ids in results:
-            global_i = index_map[local_i]
-            for local_j in neighbor_ids:
-                global_j = index_map[local_j]
-                graph[global_i].add(global_j)
-                graph[global_j].add(global_i)  # Bidirectional
+            if self.entry_point is None:
+                self.entry_point = node
+                return node
 
-        return {k: list(v) for k, v in graph.items()}
+            # Greedy descent through the layers above the new node's level
+            stats = {}
+            entry = self.entry_point
+            for layer in range(top, level, -1):
+                entry, _ = self._greedy_search_layer(vector, entry, layer, stats)
+                self.build_distance_evals += stats["distance_evals"]
 
-    def search(self, query_vector, dynamic_entry=True):
-        """Greedy layer-wise HNSW search using cosine similarity (assumes normalized vectors)."""
+            entries = [entry]
+            for layer in range(min(level, top), -1, -1):
+                graph = self.graphs[layer]
+                candidates = self._search_layer(vector, entries, self.ef_construction, layer, stats=stats)
+                self.build_distance_evals += stats["distance_evals"]
+                neighbors = self._select_neighbors(candidates, self.M)
+                graph.set_neighbors(node, neighbors)
+
+                max_links = self._max_links(layer)
+                for neighbor in neighbors:
+                    links = graph.neighbors(neighbor).tolist() + [node]
+                    if len(links) > max_links:
+                        links = self._prune_links(neighbor, links, max_links)
+                    graph.set_neighbors(neighbor, links)
+
+                entries = [n for _, n in candidates]
+
+            if level > top:
+                self.entry_point = node
+
+        return node
+
+    def delete(self, node):
+        """
+        Tombstone a node. It keeps routing searches but is never returned as a
+        result, by this index or by an ACORN1 built on it.
+        """
+        node = int(node)
+        if not 0 <= node < self.num_nodes:
+            raise IndexError(f"Node {node} is not in the index.")
+        with self._rw_lock.write():
+            self.deleted.add(node)
+
+    def reading(self):
+        """
+        Hold the read side of the index lock, for searches of indexes that share
+        this one's vectors, codes and tombstones (ACORN1).
+        """
+        return self._rw_lock.read()
+
+    def _append_vector(self, vector, label):
+        if self.num_nodes == len(self._data):
+            grown = np.empty((max(16, 2 * len(self._data)), self._data.shape[1]), dtype=np.float32)
+            grown[:self.num_nodes] = self._data[:self.num_nodes]
+            self._data = grown
+        self._data[self.num_nodes] = vector
+        self.labels.append(label)
+        self.num_nodes += 1
+        return self.num_nodes - 1
+
+    def _select_neighbors(self, candidates, m):
+        """
+        Neighbor selection heuristic (Malkov & Yashunin, Alg. 4).
+
+        candidates is a list of (distance, node) sorted by distance to the base
+        vector. A candidate is kept only if it is closer to the base vector than
+        to every neighbor selected so far, which keeps links spread out.
+        """
+        selected = []
+        for dist, node in candidates:
+            if len(selected) >= m:
+                break
+            if not selected or np.all(1 - self._data[selected] @ self._data[node] > dist):
+                selected.append(node)
+        return selected
+
+    def _prune_links(self, node, links, max_links):
+        dists = 1 - self._data[links] @ self._data[node]
+        order = np.argsort(dists)
+        candidates = [(float(dists[i]), links[i]) for i in order]
+        return self._select_neighbors(candidates, max_links)
+
+    def _search_layer(self, query_vector, entry_points, ef, layer, expanded=None, stats=None, score=None):
+        """
+        Best-first search of one layer keeping the ef closest nodes found
+        (csr_graph.best_first_search).
+
+        Each expansion scores all unvisited neighbors with one gather-matmul.
+        If expanded is a list, every node whose neighbors get scored is
+        appended to it in expansion order (used as the traversal path). If
+        stats is a dict, the number of distance evaluations is stored in it
+        (callers add it to distance_evals or build_distance_evals).
+        score maps node ids to distances (default: exact float32, see
+        distance_function).
+
+        Returns:
+            List[Tuple[float, int]]: (distance, node) pairs sorted by distance
+        """
+        score = score or self._exact_distance_function(query_vector)
+        table = thread_visited_table(self._visited)
+        epoch = table.reset(self.num_nodes)
+        results, scored = best_first_search(self.graphs[layer], score, entry_points, ef, table.marks, epoch,
+                                            expanded=expanded)
+        if stats is not None:
+            stats["distance_evals"] = scored
+        return results
+
+    # ========== Search ==========
+
+    def _greedy_search_layer(self, query_vector, current_node, layer, stats=None, score=None):
+        """
+        Greedy hill-climbing on one layer. Returns the local optimum and the path to it.
+        If stats is a dict, the number of distance evaluations is stored in it.
+        """
+        graph = self.graphs[layer]
+        score = score or self._exact_distance_function(query_vector)
+        layer_visited = [current_node]  # Start with current node
+        best_dist = score([current_node])[0]
+
+        scored = 0
+        while True:
+            neighbors = graph.neighbors(current_node)
+            if not len(neighbors):
+                break
+            dists = score(neighbors)
+            scored += len(neighbors)
+            best = int(np.argmin(dists))
+            if dists[best] >= best_dist:
+                break
+            best_dist = dists[best]
+            current_node = int(neighbors[best])
+            layer_visited.append(current_node)
+
+        if stats is not None:
+            stats["distance_evals"] = scored
+        return current_node, layer_visited
+
+    def knn_search(self, query_vector, k=10, ef_search=None, trace=None):
+        """
+        Layer-wise HNSW search: greedy descent on the upper layers, then a beam
+        search with ef_search candidates on layer 0.
+
+        If trace (instrumentation.QueryTrace) is given, per-layer expansions,
+        distance evaluations, visited nodes and timings are recorded under "hnsw".
+        On a quantized index the layers are searched on the compressed codes
+        and the ef candidates of layer 0 are re-ranked with the float32 vectors.
+
+        Returns:
+            (List[Tuple[int, float]], dict, int): up to k (node, cosine distance)
+            pairs sorted by distance, the per-layer traversal log and the entry point
+        """
+        with self._rw_lock.read():
+            return self._knn_search(query_vector, k, ef_search, trace)
+
+    def _knn_search(self, query_vector, k, ef_search, trace):
         query_vector = query_vector / np.linalg.norm(query_vector)
+        ef = max(ef_search or self.ef_search, k)
         traversal_log = {}
         current_node = self.entry_point
 
+        stats = {}
+        evals = 0
+        score = self.distance_function(query_vector)
+
         for layer in sorted(self.layers.keys(), reverse=True):
-            layer_visited = [current_node]  # Start with current node
-            improved = True
+            if layer == 0:
+                break
+            if trace is not None:
+                start = time.perf_counter_ns()
+            current_node, layer_visited = self._greedy_search_layer(
+                query_vector, current_node, layer, stats, score=score
+            )
+            traversal_log[layer] = layer_visited  # Save layer's traversal
+            evals += stats["distance_evals"]
+            if trace is not None:
+                trace.record_layer("hnsw", layer, len(layer_visited), stats["distance_evals"],
+                                   stats["distance_evals"] + 1, time.perf_counter_ns() - start)
+
+        if trace is not None:
+            start = time.perf_counter_ns()
+        base_path = []
+        candidates = self._search_layer(
+            query_vector, [current_node], ef, 0, expanded=base_path, stats=stats, score=score
+        )
+        traversal_log[0] = base_path
+        evals += stats["distance_evals"]
+        if self.quantizer is not None:
+            candidates = self.rerank(query_vector, [node for _, node in candidates])
+            evals += len(candidates)
+        self._search_evals.add(evals)
+        if trace is not None:
+            trace.record_layer("hnsw", 0, len(base_path), stats["distance_evals"],
+                               stats["distance_evals"] + 1, time.perf_counter_ns() - start)
 
-            while improved:
-                improved = False
-                best_dist = 1 - np.dot(query_vector, self.data[current_node])
-                best_node = current_node
+        results = [(node, dist) for dist, node in candidates if node not in self.deleted][:k]
+        return results, traversal_log, self.entry_point
 
-                for neighbor in self.graphs[layer].get(current_node, []):
-                    dist = 1 - np.dot(query_vector, self.data[neighbor])
-                    if dist < best_dist:
-                        best_dist = dist
-                        best_node = neighbor
-                        improved = True
+    def _exact_distance_function(self, query_vector):
+        data = self._data
+        return lambda ids: 1 - data[ids] @ query_vector
 
-                if improved:
-                    current_node = best_node
-                    layer_visited.append(current_node)
+    def distance_function(self, query_vector):
+        """
+        Distances of a normalized query to node ids, as a function of the ids:
+        asymmetric distances on the compressed codes if the index is quantized,
+        exact float32 cosine distances otherwise.
+        """
+        if self.quantizer is not None:
+            return self.quantizer.distance_function(query_vector)
+        return self._exact_distance_function(query_vector)
 
-            traversal_log[layer] = layer_visited  # Save layer's traversal
+    def quantize(self, kind, subspaces=None):
+        """
+        Compress the vectors for traversal ("sq8": 4x smaller, "pq": 4 * dim / subspaces x).
+        The float32 vectors are kept for re-ranking.
+        """
+        self.quantizer = fit_quantizer(self.data, kind, subspaces=subspaces, seed=self.seed)
+        print(f"✅ Quantized {self.num_nodes} vectors ({kind}): "
+              f"{self.data.nbytes / 2**20:.1f} MiB → {self.quantizer.nbytes / 2**20:.1f} MiB")
+
+    def rerank(self, query_vector, nodes):
+        """Exact float32 (distance, node) pairs for nodes, sorted by distance."""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        dists = 1 - self._data[nodes] @ query_vector
+        return sorted(zip(dists.tolist(), nodes.tolist()))
+
+    def search(self, query_vector, dynamic_entry=True, ef_search=None, trace=None):
+        """HNSW search for the single nearest node (assumes cosine similarity)."""
+        results, traversal_log, entry_point = self.knn_search(
+            query_vector, k=1, ef_search=ef_search, trace=trace
+        )
+        best = results[0][0] if results else traversal_log[0][-1]
+        return best, traversal_log, entry_point
+
+    def search_batch(self, queries, k=10, ef_search=None):
+        """
+        Search many queries at once. The queries advance in lockstep, so every
+        hop scores the neighbors of the whole batch with one vectorized pass.
+
+        Returns:
+            (np.ndarray, np.ndarray): (n_queries, k) node ids and cosine
+            distances, sorted by distance; missing entries are -1 / inf
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        ef = max(ef_search or self.ef_search, k)
+
+        with self._rw_lock.read():
+            return self._search_batch(queries, k, ef)
+
+    def _search_batch(self, queries, k, ef):
+        current = np.full(len(queries), self.entry_point, dtype=np.int64)
+        for layer in sorted(self.layers.keys(), reverse=True):
+            if layer == 0:
+                break
+            current = greedy_descend_batch(self.graphs[layer], self.data, queries, current)
 
-        return current_node, traversal_log, self.entry_point
+        found = beam_search_batch(self.graphs[0], self.data, queries, current, ef, excluded=self.deleted)
+        return pack_results(found, k)
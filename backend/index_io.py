@@ -0,0 +1,75 @@
+# index_io.py
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Bump whenever the on-disk layout of a saved index changes
+FORMAT_VERSION = 1
+
+
+def save_index_dir(path, kind, manifest, arrays):
+    """
+    Write an index as a directory of .npy files plus a manifest.json.
+
+    The directory is written under a temporary name and swapped in with two
+    renames (old one aside, new one in), so readers never see a half-written
+    index and the path is only missing between those renames. Processes
+    that memory-mapped the old files keep reading them after it is deleted.
+
+    Args:
+        path (str): Target directory (replaced if it exists)
+        kind (str): Index type recorded in the manifest, checked on load
+        manifest (dict): JSON-serializable metadata
+        arrays (Dict[str, np.ndarray]): Arrays saved as <name>.npy
+    """
+    tmp_path = path.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + ".npy"), np.ascontiguousarray(array))
+
+    manifest = dict(manifest, kind=kind, format_version=FORMAT_VERSION, arrays=sorted(arrays))
+    with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_path = path.rstrip(os.sep) + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def load_index_dir(path, kind, mmap=True):
+    """
+    Read a directory written by save_index_dir.
+
+    Args:
+        path (str): Index directory
+        kind (str): Expected index type
+        mmap (bool): Memory-map the arrays read-only instead of reading them into RAM
+
+    Returns:
+        Tuple[dict, Dict[str, np.ndarray]]: manifest and arrays
+    """
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No saved index at {path}")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("kind") != kind:
+        raise ValueError(f"{path} holds a '{manifest.get('kind')}' index, expected '{kind}'.")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"{path} uses index format {manifest.get('format_version')}, expected {FORMAT_VERSION}."
+        )
+
+    arrays = {
+        name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None)
+        for name in manifest["arrays"]
+    }
+    return manifest, arrays
@@ -0,0 +1,122 @@
+# instrumentation.py
+"""
+Opt-in per-query instrumentation of the search hot path.
+
+A QueryTrace travels with one query through get_query_embedding and the
+indexes' knn_search. It collects phase timings (perf_counter_ns) and, per
+index and layer, the number of expanded nodes, distance evaluations, visited
+nodes and elapsed time. Every instrumented function takes trace=None and only
+touches it behind an `if trace is not None` check, so a query without a trace
+pays nothing beyond that check.
+
+MetricsRegistry aggregates finished traces for the /metrics endpoint.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+
+class QueryTrace:
+    """Counters and timings of a single query."""
+
+    __slots__ = ("phases_ns", "searches")
+
+    def __init__(self):
+        self.phases_ns = {}  # phase name -> elapsed ns
+        self.searches = {}   # index name -> {layer: stats}
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block and add it to phase `name`."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter_ns() - start)
+
+    def add_phase(self, name, elapsed_ns):
+        self.phases_ns[name] = self.phases_ns.get(name, 0) + elapsed_ns
+
+    def record_layer(self, index, layer, expanded, distance_evals, visited, elapsed_ns):
+        """Stats of one layer of one index's search."""
+        self.searches.setdefault(index, {})[layer] = {
+            "expanded": int(expanded),
+            "distance_evals": int(distance_evals),
+            "visited": int(visited),
+            "time_ms": round(elapsed_ns / 1e6, 4),
+        }
+
+    def to_dict(self):
+        report = {"phases_ms": {name: round(ns / 1e6, 4) for name, ns in self.phases_ns.items()}}
+        for index, layers in self.searches.items():
+            report[index] = {
+                "distance_evals": sum(s["distance_evals"] for s in layers.values()),
+                "expanded": sum(s["expanded"] for s in layers.values()),
+                "visited": sum(s["visited"] for s in layers.values()),
+                "layers": {str(layer): stats for layer, stats in sorted(layers.items(), reverse=True)},
+            }
+        return report
+
+
+def phase(trace, name):
+    """trace.phase(name), or a no-op context when tracing is off."""
+    return trace.phase(name) if trace is not None else nullcontext()
+
+
+def _flatten(report, prefix=""):
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name + ".")
+        else:
+            yield name, value
+
+
+class MetricsRegistry:
+    """
+    Thread-safe aggregate of QueryTrace reports per endpoint.
+
+    Every numeric field of a report becomes a metric with a running count,
+    mean and max; p50 / p95 come from the most recent `window` values.
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, trace):
+        with self._lock:
+            metrics = self._endpoints.setdefault(endpoint, {})
+            for name, value in _flatten(trace.to_dict()):
+                stats = metrics.get(name)
+                if stats is None:
+                    stats = metrics[name] = {"count": 0, "sum": 0.0, "max": value,
+                                             "recent": deque(maxlen=self.window)}
+                stats["count"] += 1
+                stats["sum"] += value
+                stats["max"] = max(stats["max"], value)
+                stats["recent"].append(value)
+
+    def snapshot(self):
+        with self._lock:
+            report = {}
+            for endpoint, metrics in self._endpoints.items():
+                report[endpoint] = {}
+                for name, stats in sorted(metrics.items()):
+                    recent = np.fromiter(stats["recent"], dtype=float)
+                    report[endpoint][name] = {
+                        "count": stats["count"],
+                        "mean": round(stats["sum"] / stats["count"], 4),
+                        "p50": round(float(np.percentile(recent, 50)), 4),
+                        "p95": round(float(np.percentile(recent, 95)), 4),
+                        "max": round(float(stats["max"]), 4),
+                    }
+            return report
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
@@ -0,0 +1,72 @@
+# lod.py
+"""
+Level-of-detail structure over the 3D point cloud.
+
+Level l cuts the bounding box of the points into a (2**l)^3 grid and keeps one
+representative per non-empty cell: the point with the lowest priority value
+(by default the lowest id, i.e. the most frequent GloVe word). Levels get finer
+until every point is its own representative (or max_level is reached), so a
+client can ask for as many points as it can draw in the region it is looking
+at and get an even spread of them.
+"""
+import numpy as np
+
+
+class PointLOD:
+    def __init__(self, points, priority=None, max_level=10):
+        """
+        Parameters:
+        - points: (n, 3) positions (the 3D PCA projection)
+        - priority: Optional (n,) values; the lowest one in a cell represents it
+        - max_level: Finest grid level (2**max_level cells per axis)
+        """
+        self.points = np.asarray(points, dtype=np.float32)
+        n = len(self.points)
+        self.low = self.points.min(axis=0)
+        extent = self.points.max(axis=0) - self.low
+        extent[extent == 0] = 1
+        priority = np.arange(n) if priority is None else np.asarray(priority)
+
+        self.levels = []  # Per level: (representative ids, points in their cells)
+        for level in range(max_level + 1):
+            side = 2 ** level
+            cells = np.minimum(((self.points - self.low) / extent * side).astype(np.int64), side - 1)
+            keys = (cells[:, 0] * side + cells[:, 1]) * side + cells[:, 2]
+            order = np.lexsort((priority, keys))
+            sorted_keys = keys[order]
+            first = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            self.levels.append((order[first], np.diff(np.r_[first, n])))
+            if len(first) == n:
+                break
+
+    def select(self, budget, bounds=None, include=None):
+        """
+        Representatives of the finest level that fits the budget.
+
+        Args:
+            budget (int): Most points to return (before `include`)
+            bounds (Sequence[float], optional): (x0, y0, z0, x1, y1, z1); only
+                representatives inside the box are returned and counted
+            include (Sequence[int], optional): Ids always returned (e.g. a traversal path)
+
+        Returns:
+            (np.ndarray, np.ndarray, int): ids, the number of points each one
+            stands for (1 for included extras) and the level used
+        """
+        if bounds is not None:
+            low, high = np.asarray(bounds[:3]), np.asarray(bounds[3:])
+        best = None
+        for level, (ids, counts) in enumerate(self.levels):
+            if bounds is not None:
+                inside = np.all((self.points[ids] >= low) & (self.points[ids] <= high), axis=1)
+                ids, counts = ids[inside], counts[inside]
+            if best is not None and len(ids) > budget:
+                break
+            best = (ids, counts, level)
+
+        ids, counts, level = best
+        if include is not None and len(include):
+            extra = np.setdiff1d(np.asarray(include, dtype=ids.dtype), ids)
+            ids = np.concatenate([ids, extra])
+            counts = np.concatenate([counts, np.ones(len(extra), dtype=counts.dtype)])
+        return ids, counts, level
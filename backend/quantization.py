@@ -0,0 +1,194 @@
+# quantization.py
+"""
+Compressed vector stores for graph traversal.
+
+Both quantizers encode normalized float32 vectors into small codes and score a
+query against any subset of them with asymmetric distances: the query stays in
+float32 and is folded into a per-query table once, so scoring a node costs a
+table lookup (PQ) or a uint8 dot product (SQ8) instead of reading 4 * dim bytes.
+
+- ScalarQuantizer ("sq8"): one uint8 per dimension, per-dimension min/step (4x smaller)
+- ProductQuantizer ("pq"): the vector is split into `subspaces` chunks (default:
+  default_subspaces(dim)), each stored
+  as the uint8 id of its nearest k-means centroid (4 * dim / subspaces x smaller)
+
+Distances are approximate cosine distances (1 - approximate dot product), so
+callers re-rank their final candidates with the exact float32 vectors.
+"""
+import numpy as np
+from sklearn.cluster import KMeans
+
+# Vectors used to fit the PQ codebooks
+PQ_TRAIN_SAMPLES = 65536
+
+
+class _CodeStore:
+    """
+    The (n, code_size) uint8 codes of a quantizer, in a buffer that doubles
+    when full so that append() is amortized O(1) for indexes that grow online.
+    """
+
+    @property
+    def codes(self):
+        return self._codes[:self.num_codes]
+
+    @codes.setter
+    def codes(self, codes):
+        self._codes = codes
+        self.num_codes = len(codes)
+
+    def append(self, vector):
+        if self.num_codes == len(self._codes):
+            grown = np.empty((max(16, 2 * len(self._codes)), self._codes.shape[1]), dtype=np.uint8)
+            grown[:self.num_codes] = self._codes[:self.num_codes]
+            self._codes = grown
+        self._codes[self.num_codes] = self.encode(vector)[0]
+        self.num_codes += 1
+
+
+class ScalarQuantizer(_CodeStore):
+    kind = "sq8"
+
+    def __init__(self, low, step, codes):
+        self.low = low    # (dim,) float32
+        self.step = step  # (dim,) float32
+        self.codes = codes  # (n, dim) uint8
+
+    @classmethod
+    def fit(cls, data):
+        """Per-dimension min / max scaling of data into 256 levels."""
+        data = np.asarray(data, dtype=np.float32)
+        low = data.min(axis=0)
+        step = (data.max(axis=0) - low) / 255
+        step[step == 0] = 1
+        quantizer = cls(low, step.astype(np.float32), np.empty((0, data.shape[1]), dtype=np.uint8))
+        quantizer.codes = quantizer.encode(data)
+        return quantizer
+
+    def encode(self, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return np.clip(np.rint((vectors - self.low) / self.step), 0, 255).astype(np.uint8)
+
+    def distance_function(self, query_vector):
+        """
+        Approximate cosine distance of query_vector to node ids:
+        x ≈ low + code * step, so x · q = code · (step * q) + low · q.
+        """
+        scaled = (self.step * query_vector).astype(np.float32)
+        offset = float(self.low @ query_vector)
+        codes = self.codes
+        return lambda ids: 1 - offset - codes[ids] @ scaled
+
+    @property
+    def nbytes(self):
+        return int(self.codes.nbytes + self.low.nbytes + self.step.nbytes)
+
+    @property
+    def config(self):
+        return {"kind": self.kind}
+
+    def to_arrays(self):
+        return {"low": self.low, "step": self.step, "codes": self.codes}
+
+    @classmethod
+    def from_arrays(cls, config, arrays):
+        return cls(arrays["low"], arrays["step"], arrays["codes"])
+
+
+def default_subspaces(dim):
+    """Largest divisor of dim that is at most dim // 4 (e.g. 25 for 100d, 10 for 50d)."""
+    return next(s for s in range(max(1, dim // 4), 0, -1) if dim % s == 0)
+
+
+class ProductQuantizer(_CodeStore):
+    kind = "pq"
+
+    def __init__(self, centroids, codes):
+        self.centroids = centroids  # (subspaces, k, sub_dim) float32
+        self.codes = codes  # (n, subspaces) uint8
+        self.subspaces, _, self.sub_dim = centroids.shape
+        self._rows = np.arange(self.subspaces)
+
+    @classmethod
+    def fit(cls, data, subspaces=None, seed=None):
+        """
+        Train one 256-centroid k-means codebook per subspace.
+
+        Args:
+            data (np.ndarray): Normalized vectors, shape (n, dim)
+            subspaces (int, optional): Number of chunks; must divide dim
+                (default: the largest divisor of dim that is at most dim // 4,
+                i.e. 16x compression when dim is a multiple of 4)
+            seed (int, optional): Seed of the training sample and k-means
+        """
+        data = np.asarray(data, dtype=np.float32)
+        n, dim = data.shape
+        subspaces = subspaces or default_subspaces(dim)
+        if not 1 <= subspaces <= dim or dim % subspaces:
+            raise ValueError(f"subspaces={subspaces} does not divide the vector dimension {dim}.")
+        sub_dim = dim // subspaces
+        clusters = min(256, n)
+
+        rng = np.random.default_rng(seed)
+        sample = data[rng.choice(n, size=min(n, PQ_TRAIN_SAMPLES), replace=False)]
+        centroids = np.empty((subspaces, clusters, sub_dim), dtype=np.float32)
+        for s in range(subspaces):
+            chunk = sample[:, s * sub_dim:(s + 1) * sub_dim]
+            kmeans = KMeans(n_clusters=clusters, n_init=1, max_iter=50, random_state=seed).fit(chunk)
+            centroids[s] = kmeans.cluster_centers_
+
+        quantizer = cls(centroids, np.empty((0, subspaces), dtype=np.uint8))
+        quantizer.codes = quantizer.encode(data)
+        return quantizer
+
+    def encode(self, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for s in range(self.subspaces):
+            chunk = vectors[:, s * self.sub_dim:(s + 1) * self.sub_dim]
+            centroids = self.centroids[s]
+            # argmin ||x - c||² = argmin (||c||² - 2 x · c)
+            scores = (centroids ** 2).sum(axis=1) - 2 * chunk @ centroids.T
+            codes[:, s] = scores.argmin(axis=1)
+        return codes
+
+    def distance_function(self, query_vector):
+        """
+        Approximate cosine distance of query_vector to node ids from a
+        (subspaces, 256) table of query · centroid products.
+        """
+        table = np.einsum('skd,sd->sk', self.centroids, query_vector.reshape(self.subspaces, self.sub_dim))
+        rows, codes = self._rows, self.codes
+        return lambda ids: 1 - table[rows, codes[ids]].sum(axis=1)
+
+    @property
+    def nbytes(self):
+        return int(self.codes.nbytes + self.centroids.nbytes)
+
+    @property
+    def config(self):
+        return {"kind": self.kind, "subspaces": self.subspaces}
+
+    def to_arrays(self):
+        return {"centroids": self.centroids, "codes": self.codes}
+
+    @classmethod
+    def from_arrays(cls, config, arrays):
+        return cls(arrays["centroids"], arrays["codes"])
+
+
+QUANTIZERS = {ScalarQuantizer.kind: ScalarQuantizer, ProductQuantizer.kind: ProductQuantizer}
+
+
+def fit_quantizer(data, kind, subspaces=None, seed=None):
+    """Fit the quantizer named `kind` ("sq8" or "pq") on data."""
+    if kind == "sq8":
+        return ScalarQuantizer.fit(data)
+    if kind == "pq":
+        return ProductQuantizer.fit(data, subspaces=subspaces, seed=seed)
+    raise ValueError(f"Unknown quantization '{kind}', expected one of {sorted(QUANTIZERS)}.")
+
+
+def load_quantizer(config, arrays):
+    """Rebuild a quantizer from its config and to_arrays() output."""
+    return QUANTIZERS[config["kind"]].from_arrays(config, arrays)
@@ -0,0 +1,110 @@
+# search_log.py
+"""
+Bounded log of recent searches with streaming per-algorithm aggregates.
+
+Only the last `capacity` entries are kept (ring buffer). Aggregates are
+updated as entries arrive, over every search since startup: count, means, a
+latency histogram with log-spaced buckets (for approximate quantiles) and a
+histogram of result similarities. Reading them costs the same no matter how
+many searches were logged.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+# Latency buckets: [0, 0.01 ms), then doubling up to ~84 s, then overflow
+LATENCY_BOUNDS_MS = 0.01 * 2.0 ** np.arange(24)
+# Similarity buckets over [-1, 1]
+SIMILARITY_BINS = 20
+
+
+class AlgorithmStats:
+    """Streaming aggregates of one algorithm's time_ms / steps / sim."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time_ms = 0.0
+        self.total_steps = 0
+        self.total_sim = 0.0
+        self.max_time_ms = 0.0
+        self.latency_hist = np.zeros(len(LATENCY_BOUNDS_MS) + 1, dtype=np.int64)
+        self.similarity_hist = np.zeros(SIMILARITY_BINS, dtype=np.int64)
+
+    def add(self, time_ms, steps, sim):
+        self.count += 1
+        self.total_time_ms += time_ms
+        self.total_steps += steps
+        self.total_sim += sim
+        self.max_time_ms = max(self.max_time_ms, time_ms)
+        self.latency_hist[np.searchsorted(LATENCY_BOUNDS_MS, time_ms, side="right")] += 1
+        bucket = int((min(max(sim, -1.0), 1.0) + 1) / 2 * SIMILARITY_BINS)
+        self.similarity_hist[min(bucket, SIMILARITY_BINS - 1)] += 1
+
+    def latency_quantile(self, q):
+        """Upper edge of the histogram bucket holding the q-quantile (an upper bound, within 2x)."""
+        if not self.count:
+            return None
+        bucket = int(np.searchsorted(np.cumsum(self.latency_hist), q * self.count))
+        if bucket >= len(LATENCY_BOUNDS_MS):
+            return round(self.max_time_ms, 3)
+        return round(min(float(LATENCY_BOUNDS_MS[bucket]), self.max_time_ms), 3)
+
+    def to_dict(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_time_ms": round(self.total_time_ms / self.count, 3),
+            "mean_steps": round(self.total_steps / self.count, 2),
+            "mean_sim": round(self.total_sim / self.count, 4),
+            "p50_time_ms": self.latency_quantile(0.5),
+            "p95_time_ms": self.latency_quantile(0.95),
+            "p99_time_ms": self.latency_quantile(0.99),
+            "max_time_ms": round(self.max_time_ms, 3),
+            "latency_histogram": {
+                "bounds_ms": [round(float(b), 3) for b in LATENCY_BOUNDS_MS],
+                "counts": self.latency_hist.tolist(),
+            },
+            "similarity_histogram": {
+                "edges": np.linspace(-1, 1, SIMILARITY_BINS + 1).round(2).tolist(),
+                "counts": self.similarity_hist.tolist(),
+            },
+        }
+
+
+class SearchLog:
+    """
+    Thread-safe ring buffer of search entries plus AlgorithmStats per algorithm.
+
+    An entry looks like {"word": ..., "<algorithm>": {"time_ms", "steps", "sim"}, ...}.
+    """
+
+    def __init__(self, capacity=1000, algorithms=("hnsw", "acorn")):
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.algorithms = algorithms
+        self.total = 0
+        self.stats = {name: AlgorithmStats() for name in algorithms}
+
+    def append(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+            for name in self.algorithms:
+                if name in entry:
+                    row = entry[name]
+                    self.stats[name].add(row["time_ms"], row["steps"], row["sim"])
+
+    def page(self, offset=0, limit=50):
+        """Recent entries, newest first, skipping `offset` of them."""
+        with self._lock:
+            end = len(self._entries) - offset
+            return [self._entries[i] for i in range(end - 1, max(end - limit, 0) - 1, -1)]
+
+    def aggregates(self):
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    def __len__(self):
+        return len(self._entries)
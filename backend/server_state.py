@@ -0,0 +1,411 @@
+# server_state.py
+"""
+Everything the server needs to answer queries, loaded in background threads
+so the app can bind its port right away.
+
+Components and their order:
+    embeddings -> projection (3D PCA)  --+
+               -> indexes (HNSW, ACORN-1) +-> dataset (/dataset payload)
+
+Each component moves through "pending" -> "loading" -> "ready" (or "error"),
+reported by /health. The SBERT model is only loaded on the first
+out-of-vocabulary query. The 3D projection (keyed by the vector checksum)
+and the SBERT -> GloVe PCA (keyed by the model and its training words) are
+cached on disk next to the saved indexes.
+
+For multi-process serving (gunicorn.conf.py) one process builds everything
+and publish()es it; workers created with config["attach"] = True then only
+memory-map the published artifacts (GloVe cache, indexes, 3D projection)
+read-only, so every worker shares the same physical pages.
+
+Queries run concurrently against an IndexSnapshot: an immutable bundle of the
+indexes and arrays, swapped in as a whole, so a request never sees a mix of
+old and new state. SBERT encodes go through a MicroBatchEncoder, which merges
+concurrent out-of-vocabulary words into one forward pass, and index searches
+run on a shared thread pool (search_pool).
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+
+from glove_loader import load_glove_embeddings
+from hnsw_index import CompleteHNSW
+from acorn1_index import ACORN1
+from ann_registry import ANN_REGISTRY, ACORN1Index, HNSWIndex
+from encoder import MicroBatchEncoder
+from index_io import load_index_dir, save_index_dir
+from instrumentation import MetricsRegistry
+from lod import PointLOD
+from search_log import SearchLog
+from sharded_index import build_sharded_indexes, load_sharded_indexes
+from vector_ops import (
+    reduce_dimensions,
+    normalize_vectors,
+    build_word_index,
+    QueryEmbeddingCache,
+    fit_sbert_to_glove_pca,
+    get_pca_info,
+    vector_checksum
+)
+
+
+def load_or_build_indexes(vectors, index_dir, hnsw_params, acorn_params, checksum=None, num_shards=1):
+    """
+    Memory-map the saved HNSW / ACORN-1 indexes, or build and save them.
+    With num_shards > 1 they are sharded (see sharded_index.py) and saved under index_dir/sharded.
+    """
+    checksum = checksum or vector_checksum(vectors)
+    try:
+        hnsw, acorn = _load_indexes(index_dir, checksum, num_shards)
+        # Compared per index: both have e.g. their own ef_search
+        wanted_hnsw = {**hnsw_params, "num_shards": num_shards} if num_shards > 1 else hnsw_params
+        stale = [f"hnsw.{name}" for name, value in wanted_hnsw.items() if hnsw.params.get(name) != value]
+        stale += [f"acorn.{name}" for name, value in acorn_params.items() if acorn.params.get(name) != value]
+        if not stale:
+            print(f" Loaded prebuilt indexes from {index_dir}/")
+            return hnsw, acorn
+        print(f" Saved indexes use different {stale}, rebuilding...")
+    except (FileNotFoundError, ValueError) as e:
+        print(f" No reusable saved indexes ({e}), building...")
+
+    if num_shards > 1:
+        return build_sharded_indexes(vectors, os.path.join(index_dir, "sharded"), num_shards=num_shards,
+                                     hnsw_params=hnsw_params, acorn_params=acorn_params)
+    hnsw = CompleteHNSW(vectors, **hnsw_params)
+    acorn = ACORN1(hnsw, **acorn_params)
+    hnsw.save(os.path.join(index_dir, "hnsw"))
+    acorn.save(os.path.join(index_dir, "acorn1"))
+    return hnsw, acorn
+
+
+def _load_indexes(index_dir, checksum, num_shards=1):
+    """Memory-map the saved (possibly sharded) indexes of vectors with this checksum."""
+    if num_shards > 1:
+        return load_sharded_indexes(os.path.join(index_dir, "sharded"), expected_checksum=checksum)
+    hnsw = CompleteHNSW.load(os.path.join(index_dir, "hnsw"), expected_checksum=checksum)
+    return hnsw, ACORN1.load(os.path.join(index_dir, "acorn1"), hnsw)
+
+
+# GloVe words (most frequent first) the SBERT -> GloVe PCA is fitted on
+SBERT_PCA_WORDS = 1000
+
+
+def b64_array(array, dtype):
+    """Little-endian binary of array as base64, decoded client-side into a typed array."""
+    return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode("ascii")
+
+
+# Everything a query reads, captured once per request (see ServerState.snapshot)
+IndexSnapshot = namedtuple("IndexSnapshot", [
+    "hnsw_index", "acorn_index", "texts", "word_index", "vectors", "pca_3d", "retained_variance", "dataset_etag", "lod", "ann"
+])
+
+
+class _LazyModel:
+    """Stands in for the SBERT model; loads it on the first encode()."""
+
+    def __init__(self, state):
+        self._state = state
+
+    def encode(self, sentences, **kwargs):
+        return self._state.sbert()[0].encode(sentences, **kwargs)
+
+
+class _LazyProjection:
+    """Stands in for the SBERT -> GloVe PCA; loads it on the first transform()."""
+
+    def __init__(self, state):
+        self._state = state
+
+    def transform(self, embeddings):
+        return self._state.sbert()[1].transform(embeddings)
+
+
+class ServerState:
+    COMPONENTS = ("embeddings", "projection", "indexes", "dataset")
+
+    def __init__(self, config):
+        """
+        Parameters:
+        - config: dict with glove_path, max_words, index_dir, hnsw_params,
+                  acorn_params, num_shards, algorithms, word_tags_path, sbert_model,
+                  search_log_size, encode_batch_size, encode_wait_ms, search_threads
+                  and attach (only memory-map artifacts published by another process)
+        """
+        self.config = config
+        self.algorithms = tuple(config.get("algorithms") or ANN_REGISTRY)
+        unknown = [name for name in self.algorithms if name not in ANN_REGISTRY]
+        if unknown or not {HNSWIndex.name, ACORN1Index.name} <= set(self.algorithms):
+            raise ValueError(f"algorithms must include 'hnsw' and 'acorn' and come from {sorted(ANN_REGISTRY)}.")
+        self.status = {name: "pending" for name in self.COMPONENTS}
+        self.status["sbert"] = "lazy"
+        self.errors = {}
+        self.load_times_s = {}
+        self._ready = {name: threading.Event() for name in self.COMPONENTS}
+        self._sbert_lock = threading.Lock()
+        self._sbert = None
+        self.started_at = time.perf_counter()
+
+        self.query_cache = QueryEmbeddingCache(maxsize=4096)  # SBERT fallbacks for out-of-vocabulary words
+        self.snapshot = None  # IndexSnapshot, set once the dataset is ready
+        # Concurrent out-of-vocabulary words share one SBERT forward pass
+        self.model = MicroBatchEncoder(_LazyModel(self), max_batch_size=config.get("encode_batch_size", 32),
+                                       max_wait_ms=config.get("encode_wait_ms", 5))
+        self.search_pool = ThreadPoolExecutor(max_workers=config.get("search_threads", 4),
+                                              thread_name_prefix="search")
+        self.sbert_to_glove_pca = _LazyProjection(self)
+        # Recent searches + aggregates
+        self.search_log = SearchLog(capacity=config.get("search_log_size", 1000), algorithms=self.algorithms)
+        self.metrics = MetricsRegistry()
+
+    # ========== Startup ==========
+
+    def start(self):
+        """Load all components in background threads and return immediately."""
+        threading.Thread(target=self._load_all, name="startup", daemon=True).start()
+
+    def load(self):
+        """Load all components in the calling thread."""
+        self._load_all()
+
+    def _load_all(self):
+        if not self._step("embeddings", self._load_embeddings):
+            return
+        projection = threading.Thread(target=self._step, args=("projection", self._load_projection), daemon=True)
+        projection.start()
+        indexes_ok = self._step("indexes", self._load_indexes)
+        projection.join()
+        if indexes_ok and self.status["projection"] == "ready":
+            self._step("dataset", self._build_dataset)
+
+    def _step(self, name, load):
+        self.status[name] = "loading"
+        start = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            traceback.print_exc()
+            self.status[name] = "error"
+            self.errors[name] = str(e)
+            return False
+        self.load_times_s[name] = round(time.perf_counter() - start, 3)
+        self.status[name] = "ready"
+        self._ready[name].set()
+        print(f"✅ {name} ready in {self.load_times_s[name]}s")
+        return True
+
+    def _load_embeddings(self):
+        texts, vectors = load_glove_embeddings(self.config["glove_path"], max_words=self.config["max_words"])
+        self.texts = texts
+        self.word_index = build_word_index(texts)
+        if self.config.get("attach"):
+            # Normalized vectors come memory-mapped with the published HNSW index
+            self.checksum = self._read_published()["checksum"]
+            return
+        self.vectors = normalize_vectors(vectors)
+        self.checksum = vector_checksum(self.vectors)
+
+    def _cache_path(self, name):
+        os.makedirs(self.config["index_dir"], exist_ok=True)
+        return os.path.join(self.config["index_dir"], f"{name}_{self.checksum[:16]}")
+
+    def _load_projection(self):
+        path = self._cache_path("projection")
+        try:
+            manifest, arrays = load_index_dir(path, "projection", mmap=True)
+            self.pca_3d, self.retained_variance = arrays["pca_3d"], manifest["retained_variance"]
+            return
+        except FileNotFoundError:
+            if self.config.get("attach"):
+                raise
+        print(" Reducing GloVe to 3D for visualization...")
+        self.pca_3d, pca = reduce_dimensions(self.vectors, n_components=3, return_model=True)
+        self.retained_variance = get_pca_info(pca)
+        save_index_dir(path, "projection", {"retained_variance": self.retained_variance}, {"pca_3d": self.pca_3d})
+
+    def _load_indexes(self):
+        num_shards = self.config.get("num_shards", 1)
+        if self.config.get("attach"):
+            hnsw_index, acorn_index = _load_indexes(self.config["index_dir"], self.checksum, num_shards)
+        else:
+            hnsw_index, acorn_index = load_or_build_indexes(
+                self.vectors, self.config["index_dir"], self.config["hnsw_params"], self.config["acorn_params"],
+                checksum=self.checksum, num_shards=num_shards
+            )
+        # Metadata for filtered ACORN-1 queries; GloVe files are sorted by corpus frequency
+        acorn_index.set_metadata("frequency_rank", np.arange(len(self.texts)))
+        acorn_index.set_metadata("length", np.array([len(word) for word in self.texts]))
+        tags_path = self.config["word_tags_path"]
+        if os.path.exists(tags_path):
+            with open(tags_path, "r", encoding="utf-8") as f:
+                word_tags = json.load(f)
+            acorn_index.set_metadata("tag", np.array([word_tags.get(word, "") for word in self.texts]))
+
+        self.hnsw_index, self.acorn_index = hnsw_index, acorn_index
+        # The index holds the same normalized vectors (memory-mapped when loaded); share them
+        self.vectors = hnsw_index.data
+
+        # Compared algorithms (ann_registry.py); HNSW / ACORN-1 wrap the saved indexes
+        ann = {HNSWIndex.name: HNSWIndex(hnsw_index), ACORN1Index.name: ACORN1Index(acorn_index)}
+        for name in self.algorithms:
+            if name not in ann:
+                ann[name] = ANN_REGISTRY[name].build(self.vectors, ann)
+        self.ann = {name: ann[name] for name in self.algorithms}
+
+    def _build_dataset(self):
+        """
+        Everything that is the same for every query: labels, 3D positions, the top
+        HNSW layer of each node and the ACORN-1 radius graph (CSR). Serialized once;
+        the ETag lets browsers revalidate instead of downloading it again. Which
+        of the points get drawn is decided per view by /points (see lod.py).
+        """
+        top_layer = np.zeros(len(self.vectors), dtype=np.uint8)
+        for layer, nodes in self.hnsw_index.layers.items():
+            top_layer[nodes] = np.maximum(top_layer[nodes], layer)
+        acorn_indptr, acorn_indices = self.acorn_index.acorn_graph.to_csr()
+
+        body = json.dumps({
+            "num_nodes": len(self.vectors),
+            "labels": list(self.texts),
+            "positions": b64_array(self.pca_3d, "<f4"),        # Float32Array, 3 per node
+            "top_layer": b64_array(top_layer, "u1"),           # Uint8Array
+            "acorn_indptr": b64_array(acorn_indptr, "<i4"),    # Int32Array, num_nodes + 1
+            "acorn_indices": b64_array(acorn_indices, "<i4")   # Int32Array
+        })
+        self.dataset_body = body
+        self.dataset_etag = hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]
+        # Level-of-detail grid for /points; upper-layer nodes, then frequent words, represent their cells
+        n = len(self.vectors)
+        self.lod = PointLOD(self.pca_3d, priority=-top_layer.astype(np.int64) * n + np.arange(n))
+        self.snapshot = IndexSnapshot(
+            self.hnsw_index, self.acorn_index, self.texts, self.word_index, self.vectors,
+            self.pca_3d, self.retained_variance, self.dataset_etag, self.lod, self.ann
+        )
+
+    # ========== Multi-process serving ==========
+
+    def _published_path(self):
+        return os.path.join(self.config["index_dir"], "published.json")
+
+    def close(self):
+        """
+        Stop the encoder thread and the search / shard thread pools. The state
+        can then be dropped, e.g. by a process that only built and published.
+        """
+        self.model.close()
+        self.search_pool.shutdown(wait=True)
+        close_shards = getattr(getattr(self, "hnsw_index", None), "close", None)
+        if close_shards is not None:
+            close_shards()
+
+    def publish(self):
+        """
+        Record that every artifact is built and saved, for processes started
+        with config["attach"] = True. Call after load() succeeded.
+        """
+        if not self.is_ready():
+            raise RuntimeError(f"Cannot publish before all components are ready: {self.health()}")
+        published = {
+            "checksum": self.checksum,
+            "glove_path": os.path.abspath(self.config["glove_path"]),
+            "max_words": self.config["max_words"],
+            "hnsw_params": self.hnsw_index.params,
+            "acorn_params": self.acorn_index.params,
+        }
+        tmp_path = self._published_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(published, f, indent=2)
+        os.replace(tmp_path, self._published_path())
+
+    def _read_published(self):
+        path = self._published_path()
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Nothing published in {self.config['index_dir']}/; run publish() first.")
+        with open(path, "r", encoding="utf-8") as f:
+            published = json.load(f)
+        if (published["glove_path"] != os.path.abspath(self.config["glove_path"])
+                or published["max_words"] != self.config["max_words"]):
+            raise ValueError("Published artifacts were built from different embeddings.")
+        return published
+
+    # ========== Lazy SBERT ==========
+
+    def sbert(self):
+        """
+        The SBERT model and the fitted SBERT -> GloVe PCA, loaded on first use.
+        The PCA is cached on disk, so later starts only load the model.
+        """
+        with self._sbert_lock:
+            if self._sbert is None:
+                self.status["sbert"] = "loading"
+                start = time.perf_counter()
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    print(" Loading SBERT model...")
+                    model = SentenceTransformer(self.config["sbert_model"])
+                    self._sbert = (model, self._load_sbert_pca(model))
+                except Exception as e:
+                    self.status["sbert"] = "error"
+                    self.errors["sbert"] = str(e)
+                    raise
+                self.load_times_s["sbert"] = round(time.perf_counter() - start, 3)
+                self.status["sbert"] = "ready"
+        return self._sbert
+
+    def _load_sbert_pca(self, model):
+        # Keyed by what the fit depends on (model, training words, GloVe dimension), not by the
+        # vector checksum, so changing max_words or the indexes keeps reusing it
+        words = self.texts[:SBERT_PCA_WORDS]
+        key = hashlib.sha256("\n".join(words).encode("utf-8")).hexdigest()[:16]
+        model_name = self.config["sbert_model"].replace("/", "_")
+        os.makedirs(self.config["index_dir"], exist_ok=True)
+        path = os.path.join(self.config["index_dir"], f"sbert_pca_{model_name}_{key}_{self.vectors.shape[1]}d.joblib")
+        if os.path.exists(path):
+            return joblib.load(path)
+        print(" Fitting SBERT → GloVe PCA...")
+        pca = fit_sbert_to_glove_pca(model, words, glove_dim=self.vectors.shape[1], max_words=SBERT_PCA_WORDS)
+        # Written under a temporary name: other worker processes may read or fit it concurrently
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(pca, tmp_path)
+        os.replace(tmp_path, path)
+        return pca
+
+    # ========== Readiness ==========
+
+    def is_ready(self, *components):
+        return all(self._ready[name].is_set() for name in components or self.COMPONENTS)
+
+    def wait(self, timeout=None):
+        """Block until every component is ready or one failed. Returns is_ready()."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.is_ready() and self.health()["status"] != "error":
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            time.sleep(0.05)
+        return self.is_ready()
+
+    def health(self):
+        if self.is_ready():
+            status = "ready"
+        elif self.errors.keys() - {"sbert"}:
+            status = "error"
+        else:
+            status = "starting"
+        return {
+            "status": status,
+            "components": dict(self.status),
+            "errors": dict(self.errors),
+            "load_times_s": dict(self.load_times_s),
+            "encoder": self.model.stats(),
+            "query_cache": self.query_cache.stats(),
+            "uptime_s": round(time.perf_counter() - self.started_at, 3),
+        }
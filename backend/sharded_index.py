@@ -0,0 +1,357 @@
+# sharded_index.py
+"""
+Sharded HNSW / ACORN-1 with scatter-gather search.
+
+The vectors are split into `num_shards` contiguous row ranges. Every shard is
+an ordinary CompleteHNSW + ACORN1 pair over its rows, built in its own worker
+process and saved under <path>/shard<i>/ (hnsw, acorn1); <path>/layout holds
+the row ranges, build parameters and all normalized vectors in global order.
+The shards are then memory-mapped back and search slices of that one vector
+array, so every process serving the index shares a single copy of it.
+
+ShardedHNSW and ShardedACORN1 take the same knn_search / search /
+search_batch arguments as the single indexes and answer in global node ids,
+so callers do not change. A query fans out to every shard on a thread pool
+and the per-shard top-k lists are merged. The returned traversal log lists
+every shard's path (in global ids); pass shard_logs=[] to also get them one
+shard at a time for visualization. A QueryTrace gets one entry per shard
+("hnsw_shard0", "acorn_shard0", ...).
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from hnsw_index import CompleteHNSW
+from acorn1_index import ACORN1
+from csr_graph import CSRGraph
+from index_io import load_index_dir, save_index_dir
+from instrumentation import QueryTrace
+from vector_ops import vector_checksum
+
+
+def _build_shard(data_path, lo, hi, hnsw_params, acorn_params, shard_path):
+    """Build and save the HNSW / ACORN-1 pair of rows lo:hi (runs in a worker process)."""
+    data = np.load(data_path, mmap_mode="r")
+    hnsw = CompleteHNSW(data[lo:hi], **hnsw_params)
+    acorn = ACORN1(hnsw, **acorn_params)
+    hnsw.save(os.path.join(shard_path, "hnsw"))
+    acorn.save(os.path.join(shard_path, "acorn1"))
+    return hnsw.build_time_s + acorn.build_time_s
+
+
+def build_sharded_indexes(data, path, num_shards=4, hnsw_params=None, acorn_params=None, n_jobs=None):
+    """
+    Partition data into num_shards row ranges, build one HNSW / ACORN-1 pair per
+    shard in a process pool, save them under path and load them back. The
+    workers are spawned, so a calling script needs an `if __name__ == "__main__"` guard.
+
+    Args:
+        data (np.ndarray): Normalized vectors, shape (n, dim)
+        path (str): Directory of the sharded index (existing shards are replaced)
+        num_shards (int): Number of shards
+        hnsw_params (dict): CompleteHNSW keyword arguments, shared by every shard
+        acorn_params (dict): ACORN1 keyword arguments, shared by every shard
+        n_jobs (int, optional): Build processes (default: one per shard, up to the core count)
+
+    Returns:
+        (ShardedHNSW, ShardedACORN1)
+    """
+    hnsw_params, acorn_params = hnsw_params or {}, acorn_params or {}
+    if not 1 <= num_shards <= len(data):
+        raise ValueError(f"num_shards must be between 1 and {len(data)}, got {num_shards}.")
+    bounds = np.linspace(0, len(data), num_shards + 1).astype(int).tolist()
+    os.makedirs(path, exist_ok=True)
+
+    source_checksum = vector_checksum(data)
+    vectors = np.array(data, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)  # As CompleteHNSW normalizes
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="shards_") as shared_dir:
+        data_path = os.path.join(shared_dir, "data.npy")
+        np.save(data_path, vectors)
+        workers = n_jobs or min(num_shards, os.cpu_count() or 1)
+        # Spawned, not forked: the server builds from a background thread while others run
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(_build_shard, data_path, bounds[i], bounds[i + 1], hnsw_params, acorn_params,
+                            os.path.join(path, f"shard{i}"))
+                for i in range(num_shards)
+            ]
+            shard_build_s = [future.result() for future in futures]
+    build_time_s = time.perf_counter() - start
+    print(f"✅ Built {num_shards} shards in {build_time_s:.2f}s "
+          f"(slowest shard {max(shard_build_s):.2f}s)")
+
+    save_index_dir(os.path.join(path, "layout"), "sharded", {
+        "num_shards": num_shards,
+        "bounds": bounds,
+        "source_checksum": source_checksum,
+        "hnsw_params": hnsw_params,
+        "acorn_params": acorn_params,
+        "build_time_s": build_time_s,
+    }, {"vectors": vectors})
+    del vectors
+    return load_sharded_indexes(path)
+
+
+def load_sharded_indexes(path, mmap=True, expected_checksum=None):
+    """
+    Load a sharded index written by build_sharded_indexes.
+
+    Returns:
+        (ShardedHNSW, ShardedACORN1)
+    """
+    manifest, arrays = load_index_dir(os.path.join(path, "layout"), "sharded", mmap=mmap)
+    if expected_checksum is not None and manifest["source_checksum"] != expected_checksum:
+        raise ValueError(f"Sharded index at {path} was built from different vectors.")
+    if "vectors" not in arrays:
+        raise ValueError(f"Sharded index at {path} predates the shared vector array; rebuild it.")
+
+    # Every shard searches its rows of the one global array instead of its own saved copy
+    vectors, bounds = arrays["vectors"], manifest["bounds"]
+    hnsw_shards, acorn_shards = [], []
+    for i in range(manifest["num_shards"]):
+        shard_path = os.path.join(path, f"shard{i}")
+        hnsw = CompleteHNSW.load(os.path.join(shard_path, "hnsw"), mmap=mmap, data=vectors[bounds[i]:bounds[i + 1]])
+        hnsw_shards.append(hnsw)
+        acorn_shards.append(ACORN1.load(os.path.join(shard_path, "acorn1"), hnsw, mmap=mmap))
+
+    offsets = bounds[:-1]
+    pool = ThreadPoolExecutor(max_workers=len(hnsw_shards), thread_name_prefix="shard")
+    hnsw = ShardedHNSW(hnsw_shards, offsets, pool, manifest["source_checksum"], vectors, manifest["build_time_s"])
+    return hnsw, ShardedACORN1(acorn_shards, offsets, pool, hnsw, manifest["build_time_s"])
+
+
+def _merge_top_k(shard_results, offsets, k):
+    """Merge per-shard (local node, distance) lists into the global top k."""
+    merged = [(dist, node + offset) for results, offset in zip(shard_results, offsets) for node, dist in results]
+    return [(int(node), dist) for dist, node in sorted(merged)[:k]]
+
+
+def _merge_batch(shard_results, offsets, k):
+    """Merge per-shard (ids, dists) search_batch outputs into global (n_queries, k) arrays."""
+    ids = np.concatenate([np.where(ids >= 0, ids + offset, -1)
+                          for (ids, _), offset in zip(shard_results, offsets)], axis=1)
+    dists = np.concatenate([dists for _, dists in shard_results], axis=1)
+    order = np.argsort(dists, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(dists, order, axis=1)
+
+
+class _ShardedBase:
+    def __init__(self, shards, offsets, pool, build_wall_time_s):
+        self.shards = shards
+        self.offsets = list(offsets)
+        self._pool = pool
+        self.num_nodes = sum(shard.num_nodes for shard in shards)
+        # Parallel build of all HNSW / ACORN-1 pairs, from the layout manifest
+        self.build_wall_time_s = build_wall_time_s
+
+    @property
+    def num_shards(self):
+        return len(self.shards)
+
+    @property
+    def build_time_s(self):
+        """Build time of this index summed over the shards (the same work as one unsharded build)."""
+        return sum(shard.build_time_s for shard in self.shards)
+
+    @property
+    def num_edges(self):
+        return sum(shard.num_edges for shard in self.shards)
+
+    def close(self):
+        """Stop the scatter-gather threads (shared by the HNSW and ACORN-1 views)."""
+        self._pool.shutdown(wait=True)
+
+    def _scatter(self, search, *args, **kwargs):
+        """search(shard, *args, **kwargs) on every shard concurrently, in shard order."""
+        futures = [self._pool.submit(search, shard, *args, **kwargs) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def _scatter_traced(self, search_shard, trace):
+        """
+        search_shard(i, shard_trace) on every shard concurrently. Each shard
+        records into its own QueryTrace, copied into trace under "<index>_shard<i>".
+        """
+        traces = [QueryTrace() if trace is not None else None for _ in self.shards]
+        found = list(self._pool.map(search_shard, range(self.num_shards), traces))
+        if trace is not None:
+            for i, shard_trace in enumerate(traces):
+                for index, layers in shard_trace.searches.items():
+                    trace.searches[f"{index}_shard{i}"] = layers
+        return found
+
+    def _shard_of(self, node):
+        return int(np.searchsorted(self.offsets, node, side="right")) - 1
+
+    @property
+    def distance_evals(self):
+        return sum(shard.distance_evals for shard in self.shards)
+
+
+class ShardedHNSW(_ShardedBase):
+    """CompleteHNSW interface over row-range shards."""
+
+    def __init__(self, shards, offsets, pool, source_checksum, data, build_wall_time_s):
+        super().__init__(shards, offsets, pool, build_wall_time_s)
+        self.source_checksum = source_checksum
+        self.ef_search = shards[0].ef_search
+        self.quantizer = shards[0].quantizer
+        self.entry_point = shards[0].entry_point + self.offsets[0]
+        self.data = data  # All normalized vectors in global order; the shards hold slices of it
+
+    @property
+    def params(self):
+        return {**self.shards[0].params, "num_shards": self.num_shards}
+
+    @property
+    def layers(self):
+        """Global node ids of every layer, over all shards."""
+        layers = {}
+        for shard, offset in zip(self.shards, self.offsets):
+            for layer, nodes in shard.layers.items():
+                layers.setdefault(layer, []).extend(int(node) + offset for node in nodes)
+        return layers
+
+    @property
+    def nbytes(self):
+        return sum(shard.nbytes for shard in self.shards)
+
+    @property
+    def build_distance_evals(self):
+        return sum(shard.build_distance_evals for shard in self.shards)
+
+    def knn_search(self, query_vector, k=10, ef_search=None, trace=None, shard_logs=None):
+        """
+        Search every shard and merge their top k.
+
+        Returns:
+            (List[Tuple[int, float]], dict, int): the merged top k, each layer's
+            traversal over all shards and the entry point of the first shard
+            (global ids). If shard_logs (a list) is given, one
+            {"shard", "entry_point", "path"} dict per shard is appended to it.
+        """
+        found = self._scatter_traced(
+            lambda i, shard_trace: self.shards[i].knn_search(query_vector, k=k, ef_search=ef_search, trace=shard_trace),
+            trace
+        )
+        traversal_log = {}
+        for i, ((_, log, entry), offset) in enumerate(zip(found, self.offsets)):
+            path = {layer: [int(node) + offset for node in nodes] for layer, nodes in log.items()}
+            for layer, nodes in path.items():
+                traversal_log.setdefault(layer, []).extend(nodes)
+            if shard_logs is not None:
+                shard_logs.append({"shard": i, "entry_point": int(entry) + offset, "path": path})
+        return _merge_top_k([results for results, _, _ in found], self.offsets, k), traversal_log, self.entry_point
+
+    def search(self, query_vector, dynamic_entry=True, ef_search=None, trace=None, shard_logs=None):
+        """Sharded HNSW search for the single nearest node."""
+        results, traversal_log, entry_point = self.knn_search(
+            query_vector, k=1, ef_search=ef_search, trace=trace, shard_logs=shard_logs
+        )
+        return results[0][0], traversal_log, entry_point
+
+    def search_batch(self, queries, k=10, ef_search=None):
+        found = self._scatter(CompleteHNSW.search_batch, queries, k=k, ef_search=ef_search)
+        return _merge_batch(found, self.offsets, k)
+
+
+class ShardedACORN1(_ShardedBase):
+    """ACORN1 interface over the shards of a ShardedHNSW."""
+
+    filter_mask = ACORN1.filter_mask
+    set_metadata = ACORN1.set_metadata
+
+    def __init__(self, shards, offsets, pool, hnsw_index, build_wall_time_s):
+        super().__init__(shards, offsets, pool, build_wall_time_s)
+        self.hnsw = hnsw_index
+        self.ef_search = shards[0].ef_search
+        self.metadata = {}  # Global per-node arrays; shards receive their slice of the mask
+
+    @property
+    def params(self):
+        return {**self.shards[0].params, "num_shards": self.num_shards}
+
+    @property
+    def nbytes(self):
+        return sum(shard.nbytes for shard in self.shards)
+
+    @property
+    def acorn_graph(self):
+        """The radius graphs of all shards as one CSRGraph in global ids."""
+        indptrs, indices = [np.zeros(1, dtype=np.int64)], []
+        for shard, offset in zip(self.shards, self.offsets):
+            indptr, shard_indices = shard.acorn_graph.to_csr()
+            indptrs.append(indptr[1:] + indptrs[-1][-1])
+            indices.append(shard_indices + offset)
+        return CSRGraph(np.concatenate(indptrs), np.concatenate(indices).astype(np.int32))
+
+    def _shard_masks(self, filter):
+        if filter is None:
+            return [None] * self.num_shards
+        mask = self.filter_mask(filter)
+        return [mask[offset:offset + shard.num_nodes] for shard, offset in zip(self.shards, self.offsets)]
+
+    def filter_strategy(self, mask):
+        """Strategy of every shard for its slice of mask, e.g. "graph" or "brute_force+graph"."""
+        masks = self._shard_masks(mask)
+        return "+".join(sorted({shard.filter_strategy(m) for shard, m in zip(self.shards, masks)}))
+
+    def knn_search(self, query_vector, k=10, ef_search=None, start_node=None, trace=None, filter=None,
+                   shard_logs=None):
+        """
+        Search every shard and merge their top k. start_node (global id) is
+        used by the shard that holds it; the others start from their own
+        HNSW entry point. Shards with no node passing the filter are skipped.
+
+        Returns:
+            (List[Tuple[int, float]], List[int], int): the merged top k, the
+            expansion paths of all shards one after the other (global ids) and
+            start_node. If shard_logs (a list) is given, one
+            {"shard", "start_node", "path"} dict per shard is appended to it.
+        """
+        start_shard = self._shard_of(start_node) if start_node is not None else -1
+
+        def search_shard(i, shard_trace):
+            shard, mask = self.shards[i], masks[i]
+            if mask is not None and not mask.any():
+                return [], [], None
+            local_start = start_node - self.offsets[i] if i == start_shard else None
+            return shard.knn_search(query_vector, k=k, ef_search=ef_search, start_node=local_start,
+                                    trace=shard_trace, filter=mask)
+
+        masks = self._shard_masks(filter)
+        found = self._scatter_traced(search_shard, trace)
+        path = []
+        for i, ((_, shard_path, shard_start), offset) in enumerate(zip(found, self.offsets)):
+            shard_path = [int(node) + offset for node in shard_path]
+            path.extend(shard_path)
+            if shard_logs is not None:
+                shard_logs.append({"shard": i, "path": shard_path,
+                                   "start_node": None if shard_start is None else int(shard_start) + offset})
+        return _merge_top_k([results for results, _, _ in found], self.offsets, k), path, start_node
+
+    def search(self, query_vector, start_node=None, force_best_entry=True, ef_search=None, trace=None,
+               filter=None, shard_logs=None):
+        """
+        Sharded ACORN-1 search for the single nearest node.
+
+        Raises:
+            ValueError: If no node passes the filter
+        """
+        results, path, start_node = self.knn_search(
+            query_vector, k=1, ef_search=ef_search, start_node=start_node, trace=trace, filter=filter,
+            shard_logs=shard_logs
+        )
+        if not results:
+            raise ValueError("No node passes the filter.")
+        return results[0][0], path, start_node
+
+    def search_batch(self, queries, k=10, ef_search=None, start_nodes=None):
+        found = self._scatter(ACORN1.search_batch, queries, k=k, ef_search=ef_search)
+        return _merge_batch(found, self.offsets, k)
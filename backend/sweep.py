@@ -0,0 +1,176 @@
+# sweep.py
+"""
+Parameter sweep for CompleteHNSW and ACORN-1.
+
+Builds one index per point of the parameter grid in a process pool, measures
+recall / latency / memory at every ef_search value and writes all results plus
+their Pareto frontier (max recall, min p50 latency, min memory) to JSON. The
+app serves that file at /sweep_results for the summary tab.
+
+Work shared by every build is done once up front: the queries, their exact
+ground truth and, when a bulk HNSW build or gemm ACORN-1 construction is in
+the grid, the exact kNN lists of the dataset. Workers memory-map them.
+
+Example:
+    python sweep.py --glove glove.6B.100d.txt --max-words 20000 \
+        --M 8 16 --middle-ratio 0.05 0.1 --radius 0.3 0.5 --max-neighbors 10 20 \
+        --ef-search 10 50 --output sweep_results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from glove_loader import load_glove_embeddings
+from hnsw_index import CompleteHNSW
+from acorn1_index import ACORN1
+from ann_registry import ACORN1Index, HNSWIndex
+from benchmark import benchmark_index, exact_ground_truth, make_queries
+from vector_ops import blocked_top_k, normalize_vectors
+
+# Arrays shared with the worker processes, memory-mapped from the sweep's temp dir
+_shared = {}
+
+
+def _init_worker(shared_dir):
+    for name in os.listdir(shared_dir):
+        _shared[os.path.splitext(name)[0]] = np.load(os.path.join(shared_dir, name), mmap_mode="r")
+
+
+def _run_config(hnsw_params, acorn_grid, ef_search_values, k, seed):
+    """
+    Build one HNSW index, every ACORN-1 variant on top of it, and benchmark them all.
+
+    Returns:
+        List[dict]: one result row per (index, ef_search)
+    """
+    data = _shared["data"]
+    queries = np.asarray(_shared["queries"])
+    true_ids = _shared["true_ids"]
+    knn = (_shared["knn_ids"], _shared["knn_sims"]) if "knn_ids" in _shared else None
+
+    hnsw_index = CompleteHNSW(data, seed=seed, knn=knn[0] if knn else None, **hnsw_params)
+    hnsw_meta = {**hnsw_params, "build_time_s": round(hnsw_index.build_time_s, 3)}
+
+    rows = []
+    for ef_search in ef_search_values:
+        row = benchmark_index("hnsw", HNSWIndex(hnsw_index), queries, true_ids, k, ef_search)
+        rows.append({**row, "params": hnsw_meta, "memory_bytes": hnsw_index.nbytes})
+
+    for acorn_params in acorn_grid:
+        acorn_index = ACORN1(hnsw_index, knn=knn, **acorn_params)
+        acorn_meta = {**hnsw_params, **acorn_params, "build_time_s": round(acorn_index.build_time_s, 3)}
+        memory = hnsw_index.nbytes + acorn_index.nbytes
+        for ef_search in ef_search_values:
+            row = benchmark_index("acorn", ACORN1Index(acorn_index), queries, true_ids, k, ef_search)
+            rows.append({**row, "params": acorn_meta, "memory_bytes": memory})
+    return rows
+
+
+def pareto_frontier(rows):
+    """
+    Rows not dominated by any other row: no other row has recall at least as
+    high, p50 latency and memory at least as low, and is strictly better in one.
+    """
+    def dominates(a, b):
+        no_worse = (a["recall_at_k"] >= b["recall_at_k"] and a["p50_ms"] <= b["p50_ms"]
+                    and a["memory_bytes"] <= b["memory_bytes"])
+        better = (a["recall_at_k"] > b["recall_at_k"] or a["p50_ms"] < b["p50_ms"]
+                  or a["memory_bytes"] < b["memory_bytes"])
+        return no_worse and better
+
+    frontier = [row for row in rows if not any(dominates(other, row) for other in rows)]
+    return sorted(frontier, key=lambda row: (row["p50_ms"], -row["recall_at_k"]))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep for HNSW and ACORN-1")
+    parser.add_argument("--glove", default="glove.6B.100d.txt", help="GloVe .txt file")
+    parser.add_argument("--max-words", type=int, default=2500, help="Index the first N words")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--noise", type=float, default=0.0, help="Gaussian noise added to the query vectors")
+    parser.add_argument("--k", type=int, default=10, help="Neighbors per query for recall@k")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50], help="ef_search values to try")
+    parser.add_argument("--M", type=int, nargs="+", default=[10])
+    parser.add_argument("--middle-ratio", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--entry-ratio", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--build", choices=["incremental", "bulk"], default="incremental")
+    parser.add_argument("--radius", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--max-neighbors", type=int, nargs="+", default=[20])
+    parser.add_argument("--acorn-construction", choices=["hnsw", "gemm"], default="hnsw")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="sweep_results.json", help="Where to write the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    texts, vectors = load_glove_embeddings(args.glove, max_words=args.max_words)
+    vectors = normalize_vectors(vectors).astype(np.float32)
+
+    hnsw_grid = [
+        {"M": M, "middle_ratio": middle, "entry_ratio": entry, "build": args.build}
+        for M, middle, entry in itertools.product(args.M, args.middle_ratio, args.entry_ratio)
+    ]
+    acorn_grid = [
+        {"radius": radius, "max_neighbors": max_neighbors, "construction": args.acorn_construction}
+        for radius, max_neighbors in itertools.product(args.radius, args.max_neighbors)
+    ]
+
+    queries = make_queries(vectors, args.queries, noise=args.noise, seed=args.seed)
+    shared = {
+        "data": vectors,
+        "queries": queries,
+        "true_ids": exact_ground_truth(vectors, queries, args.k),
+    }
+    # One exact kNN pass wide enough for every build that needs it
+    widths = ([max(args.M)] if args.build == "bulk" else []) + \
+             ([max(args.max_neighbors)] if args.acorn_construction == "gemm" else [])
+    if widths:
+        shared["knn_ids"], shared["knn_sims"] = blocked_top_k(
+            vectors, vectors, max(widths), exclude_self=True, desc="Computing shared kNN lists"
+        )
+
+    start = time.perf_counter()
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="sweep_") as shared_dir:
+        for name, array in shared.items():
+            np.save(os.path.join(shared_dir, name + ".npy"), array)
+
+        with ProcessPoolExecutor(max_workers=args.n_jobs, initializer=_init_worker,
+                                 initargs=(shared_dir,)) as pool:
+            futures = [
+                pool.submit(_run_config, hnsw_params, acorn_grid, args.ef_search, args.k, args.seed)
+                for hnsw_params in hnsw_grid
+            ]
+            for future in as_completed(futures):
+                rows.extend(future.result())
+                print(f"✅ Finished {len(rows)} sweep points")
+
+    report = {
+        "config": vars(args),
+        "num_vectors": len(vectors),
+        "sweep_time_s": round(time.perf_counter() - start, 3),
+        "results": rows,
+        "pareto": pareto_frontier(rows),
+    }
+
+    print(f"\n{'algorithm':<8} {'ef':>5} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'MiB':>8}  params")
+    for row in report["pareto"]:
+        print(f"{row['algorithm']:<8} {row['ef_search']:>5} {row['recall_at_k']:>10.4f} {row['p50_ms']:>8.3f} "
+              f"{row['memory_bytes'] / 2**20:>8.2f}  {row['params']}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
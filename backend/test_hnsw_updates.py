@@ -0,0 +1,131 @@
+# test_hnsw_updates.py
+"""
+Checks for online HNSW updates: insert, delete (tombstones) and searches
+running concurrently with inserts, plus how ACORN-1 behaves on a grown index
+and filtered search on a quantized one.
+
+Run with: python -m pytest test_hnsw_updates.py (or python test_hnsw_updates.py)
+"""
+import threading
+
+import numpy as np
+
+from acorn1_index import ACORN1
+from hnsw_index import CompleteHNSW
+
+DIM = 16
+
+
+def _vectors(n, seed):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def _build(n=200, seed=0):
+    return CompleteHNSW(_vectors(n, seed), M=8, seed=seed)
+
+
+def test_insert_finds_new_node():
+    index = _build()
+    extra = _vectors(50, seed=1)
+    ids = [index.insert(v) for v in extra]
+
+    assert ids == list(range(200, 250))
+    assert index.num_nodes == 250 and len(index.data) == 250
+    for node, vector in zip(ids, extra):
+        results, _, _ = index.knn_search(vector, k=1, ef_search=50)
+        assert results[0][0] == node
+        assert all(0 <= n < index.num_nodes for n in index.graphs[0].neighbors(node))
+
+
+def test_delete_hides_node_from_every_search():
+    index = _build()
+    acorn = ACORN1(index, radius=1.0, max_neighbors=10)
+    acorn.set_metadata("rank", np.arange(index.num_nodes))
+    target = 17
+    query = index.data[target]
+    index.delete(target)
+
+    assert target not in [n for n, _ in index.knn_search(query, k=10)[0]]
+    assert target not in index.search_batch(query[None], k=10)[0][0]
+    assert target not in [n for n, _ in acorn.knn_search(query, k=10)[0]]
+    assert target not in acorn.search_batch(query[None], k=10)[0][0]
+    # Selective filter -> brute-force path
+    assert target not in [n for n, _ in acorn.knn_search(query, k=5, filter={"rank": {"lt": 20}})[0]]
+
+    try:
+        index.delete(index.num_nodes)
+    except IndexError:
+        pass
+    else:
+        raise AssertionError("Deleting a missing node should raise IndexError")
+
+
+def test_filtered_brute_force_is_exact_on_quantized_index():
+    data = np.random.default_rng(5).standard_normal((1000, 32)).astype(np.float32)
+    index = CompleteHNSW(data, M=8, seed=0, quantization="pq")
+    acorn = ACORN1(index, radius=1.0, max_neighbors=10)
+    acorn.set_metadata("rank", np.arange(index.num_nodes))
+    filter = {"rank": {"lt": 8}}
+    assert acorn.filter_strategy(acorn.filter_mask(filter)) == "brute_force"
+
+    passing = index.data[:8]
+    for query in np.random.default_rng(6).standard_normal((50, 32)).astype(np.float32):
+        exact = np.argsort(1 - passing @ (query / np.linalg.norm(query)))[:5]
+        results, _, _ = acorn.knn_search(query, k=5, filter=filter)
+        assert [n for n, _ in results] == exact.tolist()
+
+
+def test_acorn_ignores_nodes_inserted_after_build():
+    index = _build()
+    acorn = ACORN1(index, radius=1.0, max_neighbors=10)
+    entry = acorn.entry_point
+
+    # Force the next insert to become the new top-level HNSW entry point
+    index._sample_level = lambda: index.max_level + 1
+    new_node = index.insert(_vectors(1, seed=2)[0])
+    assert index.entry_point == new_node and acorn.entry_point == entry
+
+    query = _vectors(1, seed=3)[0]
+    results, _, start = acorn.knn_search(query, k=10)
+    assert start == entry
+    assert all(n < acorn.num_nodes for n, _ in results)
+    ids, _ = acorn.search_batch(query[None], k=10)
+    assert ids.max() < acorn.num_nodes
+
+
+def test_concurrent_search_during_inserts():
+    index = _build(n=300)
+    acorn = ACORN1(index, radius=1.0, max_neighbors=10)
+    errors, stop = [], threading.Event()
+
+    def searcher(seed):
+        rng = np.random.default_rng(seed)
+        while not stop.is_set():
+            try:
+                results, _, _ = index.knn_search(rng.standard_normal(DIM).astype(np.float32), k=5)
+                assert all(0 <= n < index.num_nodes for n, _ in results)
+                index.search_batch(rng.standard_normal((4, DIM)).astype(np.float32), k=5)
+                acorn.knn_search(rng.standard_normal(DIM).astype(np.float32), k=5)
+            except Exception as e:  # Collected and re-raised on the main thread
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=searcher, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for i, vector in enumerate(_vectors(1000, seed=4)):
+        index.insert(vector)
+        if i % 100 == 0:
+            index.delete(i)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors[:3]
+    assert index.num_nodes == 1300
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -1,29 +1,76 @@
 # vector_ops.py
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
-from sklearn.decomposition import PCA
+from sklearn.decomposition import IncrementalPCA
 import traceback
+from tqdm import tqdm
+
+from instrumentation import phase
+
+# Number of float32 similarity scores held in memory per blocked_top_k tile (~128 MB)
+TILE_ELEMENTS = 1 << 25
+# Rows per chunk streamed through the PCA fit / transform
+PCA_CHUNK_ROWS = 65536
+
+
+def fit_pca(data, n_components=3, chunk_rows=PCA_CHUNK_ROWS):
+    """
+    Fit PCA in one streamed float32 pass (IncrementalPCA.partial_fit per chunk of
+    rows), so memory stays bounded by chunk_rows whatever the number of rows.
+    data can be a memory-mapped array.
+
+    Parameters:
+      data : np.ndarray of shape (n_samples, n_features)
+      n_components : int, number of components to keep
+      chunk_rows : int, rows read per partial_fit call
+
+    Returns:
+      IncrementalPCA: the fitted model
+    """
+    n, dim = data.shape
+    n_components = min(n_components, dim, n)
+    starts = list(range(0, n, chunk_rows))
+    if len(starts) > 1 and n - starts[-1] < n_components:
+        starts.pop()  # partial_fit needs at least n_components rows; merge the tail
+    ends = starts[1:] + [n]
+
+    pca = IncrementalPCA(n_components=n_components)
+    for start, end in zip(starts, ends):
+        pca.partial_fit(np.asarray(data[start:end], dtype=np.float32))
+    return pca
+
+
+def pca_transform(pca, data, chunk_rows=PCA_CHUNK_ROWS):
+    """Project data with a fitted PCA chunk by chunk into a float32 array."""
+    reduced = np.empty((len(data), pca.n_components_), dtype=np.float32)
+    for start in range(0, len(data), chunk_rows):
+        reduced[start:start + chunk_rows] = pca.transform(np.asarray(data[start:start + chunk_rows], dtype=np.float32))
+    return reduced
+
 
 def reduce_dimensions(data, n_components=3, return_model=False):    
     """
-    Reduce dimensions of the input data using PCA.
+    Reduce dimensions of the input data using PCA, streamed in float32 chunks
+    (see fit_pca); the input is never copied as a whole.
     
     Parameters:
       data : np.ndarray of shape (n_samples, n_features)
       n_components : int, number of dimensions to reduce to (default: 3)
     
     Returns:
-      np.ndarray of shape (n_samples, n_components)
+      float32 np.ndarray of shape (n_samples, n_components) (and the fitted
+      PCA if return_model)
     """
     try:
-        data = np.array(data, dtype=np.float64)
-        actual_components = min(n_components, data.shape[1], data.shape[0])
-        pca = PCA(n_components=actual_components)
-        reduced = pca.fit_transform(data)
+        pca = fit_pca(data, n_components)
+        reduced = pca_transform(pca, data)
         return (reduced, pca) if return_model else reduced
     except Exception as e:
         print(f"Error in dimension reduction: {str(e)}")
         print(traceback.format_exc())
-        return np.random.rand(data.shape[0], n_components)
+        return np.random.rand(data.shape[0], n_components).astype(np.float32)
     
 def compute_cosine_similarity(query_vector, embeddings):
     """
@@ -57,28 +104,93 @@ def compute_euclidean_distance(query_vector, embeddings):
     """
     return np.linalg.norm(embeddings - query_vector, axis=1)
 
-def get_pca_info(data, n_components=3):
+def blocked_top_k(queries, data, k, block_size=None, exclude_self=False, desc=None):
     """
-    Computes how much variance is retained after PCA reduction.
+    Exact top-k neighbors by inner product (cosine for normalized vectors).
+
+    Queries are processed one tile at a time: each tile runs a single
+    `tile @ data.T` matrix multiply and an `argpartition` per row, so peak
+    memory is bounded by block_size * len(data) floats and multithreading
+    comes from BLAS.
+
+    Args:
+        queries (np.ndarray): Shape (n_queries, n_features)
+        data (np.ndarray): Shape (n_samples, n_features)
+        k (int): Number of neighbors per query
+        block_size (int, optional): Queries per tile (default: sized to ~128 MB)
+        exclude_self (bool): Skip row i of data for query i (queries is data)
+        desc (str, optional): Show a progress bar over tiles with this label
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: int32 indices and float32 similarities
+        of shape (n_queries, k), sorted by decreasing similarity
+    """
+    n_queries = len(queries)
+    k = min(k, len(data) - (1 if exclude_self else 0))
+    if k <= 0 or n_queries == 0:
+        return np.empty((n_queries, 0), dtype=np.int32), np.empty((n_queries, 0), dtype=np.float32)
+    if block_size is None:
+        block_size = max(1, min(1024, TILE_ELEMENTS // len(data)))
+
+    top_idx = np.empty((n_queries, k), dtype=np.int32)
+    top_sims = np.empty((n_queries, k), dtype=np.float32)
+    data = np.asarray(data, dtype=np.float32)
+    starts = range(0, n_queries, block_size)
+    if desc:
+        starts = tqdm(starts, desc=desc, leave=False)
+
+    for start in starts:
+        block = np.asarray(queries[start:start + block_size], dtype=np.float32)
+        sims = block @ data.T
+        if exclude_self:
+            rows = np.arange(len(block))
+            sims[rows, start + rows] = -np.inf
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        part_sims = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_sims, axis=1)
+        top_idx[start:start + len(block)] = np.take_along_axis(part, order, axis=1)
+        top_sims[start:start + len(block)] = np.take_along_axis(part_sims, order, axis=1)
+
+    return top_idx, top_sims
+
+def get_pca_info(pca):
+    """
+    Computes how much variance of the original data a fitted PCA retains.
 
     Parameters:
-        data : np.ndarray of shape (n_samples, n_features)
-        n_components : int, number of PCA dimensions to keep
+        pca : PCA / IncrementalPCA fitted on the full-dimensional data
+              (e.g. reduce_dimensions(..., return_model=True)[1])
 
     Returns:
         float: Fraction of variance retained (e.g., 0.823 means 82.3% retained)
     """
     try:
-        data = np.array(data, dtype=np.float64)
-        actual_components = min(n_components, data.shape[1], data.shape[0])
-        pca = PCA(n_components=actual_components)
-        pca.fit(data)
-        return np.sum(pca.explained_variance_ratio_)
+        return float(np.sum(pca.explained_variance_ratio_))
     except Exception as e:
         print(f"Error in computing PCA info: {str(e)}")
         print(traceback.format_exc())
         return -1.0  # or raise an error if preferred
 
+def vector_checksum(vectors, block_rows=65536):
+    """
+    SHA-256 of a vector matrix (shape and float32 contents).
+
+    Used to check that a saved index was built from the vectors being served.
+
+    Args:
+        vectors (np.ndarray): Shape (n_samples, n_features)
+
+    Returns:
+        str: Hex digest
+    """
+    vectors = np.asarray(vectors)
+    digest = hashlib.sha256(str(vectors.shape).encode())
+    for start in range(0, len(vectors), block_rows):
+        block = np.ascontiguousarray(vectors[start:start + block_rows], dtype=np.float32)
+        digest.update(block.tobytes())
+    return digest.hexdigest()
+
+
 def normalize_vectors(vectors):
     """
     Normalize vectors to unit length along axis=1 (rows).
@@ -92,44 +204,151 @@ def normalize_vectors(vectors):
     return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
 
 
-def get_query_embedding(word, model, glove_vectors, glove_words, pca_model):
+def build_word_index(words):
+    """
+    Map each word to its row in the GloVe matrix (first occurrence wins).
+
+    Built once at load time so lookups are O(1) instead of list scans.
+    """
+    index = {}
+    for i, word in enumerate(words):
+        index.setdefault(word, i)
+    return index
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of out-of-vocabulary queries and the GloVe
+    index they resolved to, so repeated queries skip SBERT + PCA + the scan.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, word):
+        """Return the cached GloVe index for word, or None on a miss."""
+        with self._lock:
+            idx = self._entries.get(word)
+            if idx is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(word)
+            self.hits += 1
+            return idx
+
+    def put(self, word, idx):
+        with self._lock:
+            self._entries[word] = idx
+            self._entries.move_to_end(word)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def get_query_embedding(word, model, glove_vectors, glove_words, pca_model, word_index=None, cache=None,
+                        trace=None):
     """
     Return vector, resolved word, and index in GloVe space.
 
     If the word is in GloVe, returns that.
     Otherwise uses SBERT + PCA to find closest match.
 
+    Args:
+        word_index (dict, optional): word -> index map from build_word_index;
+            without it the word list is scanned
+        cache (QueryEmbeddingCache, optional): LRU cache for SBERT fallbacks
+        trace (QueryTrace, optional): Records the "embedding" and "sbert_fallback" phases
+
     Returns:
         (np.ndarray, str, int): vector, word, index
     """
-    if word in glove_words:
-        idx = glove_words.index(word)
-        return glove_vectors[idx], word, idx
+    with phase(trace, "embedding"):
+        return _resolve_query_word(word, model, glove_vectors, glove_words, pca_model, word_index, cache, trace)
+
+
+def _resolve_query_word(word, model, glove_vectors, glove_words, pca_model, word_index, cache, trace):
+    if word_index is not None:
+        idx = word_index.get(word)
     else:
+        idx = glove_words.index(word) if word in glove_words else None
+    if idx is not None:
+        return glove_vectors[idx], word, idx
+
+    idx = cache.get(word) if cache is not None else None
+    if idx is None:
         print(f"'{word}' not in GloVe, falling back to SBERT...")
-        query_embed = model.encode([word])[0].reshape(1, -1)
-        reduced_query = pca_model.transform(query_embed)
-        reduced_query /= np.linalg.norm(reduced_query) + 1e-8
-        sims = np.dot(glove_vectors, reduced_query[0])
-        idx = np.argmax(sims)
+        with phase(trace, "sbert_fallback"):
+            query_embed = model.encode([word])[0].reshape(1, -1)
+            reduced_query = pca_model.transform(query_embed)
+            reduced_query /= np.linalg.norm(reduced_query) + 1e-8
+            sims = np.dot(glove_vectors, reduced_query[0])
+            idx = int(np.argmax(sims))
         print(f"Closest GloVe match: '{glove_words[idx]}'")
-        return glove_vectors[idx], glove_words[idx], idx
+        if cache is not None:
+            cache.put(word, idx)
+    return glove_vectors[idx], glove_words[idx], idx
+
 
+def get_query_embeddings(words, model, glove_vectors, glove_words, pca_model, word_index, cache=None):
+    """
+    Batched get_query_embedding: in-vocabulary words are looked up, and all
+    remaining out-of-vocabulary words are encoded with a single model.encode
+    call and matched to their closest GloVe word with one blocked matmul.
 
+    Returns:
+        (np.ndarray, List[str], np.ndarray): vectors (n_words, dim), resolved words, indices
+    """
+    indices = np.empty(len(words), dtype=np.int64)
+    pending = {}  # OOV word -> positions in `words`
+    for i, word in enumerate(words):
+        idx = word_index.get(word)
+        if idx is None and cache is not None:
+            idx = cache.get(word)
+        if idx is None:
+            pending.setdefault(word, []).append(i)
+        else:
+            indices[i] = idx
 
+    if pending:
+        oov_words = list(pending)
+        print(f"Encoding {len(oov_words)} out-of-vocabulary words with SBERT...")
+        reduced = pca_model.transform(model.encode(oov_words))
+        reduced /= np.linalg.norm(reduced, axis=1, keepdims=True) + 1e-8
+        closest, _ = blocked_top_k(reduced, glove_vectors, 1)
+        for word, idx in zip(oov_words, closest[:, 0].tolist()):
+            indices[pending[word]] = idx
+            if cache is not None:
+                cache.put(word, idx)
 
-        # print(f"'{word}' not in GloVe, using SBERT → PCA for query only")
-        # query_embed = model.encode([word])[0].reshape(1, -1)
-        # reduced_query = pca_model.transform(query_embed)
-        # reduced_query /= np.linalg.norm(reduced_query)
-        # return reduced_query[0], word, -1  # no index in glove_words
+    return np.asarray(glove_vectors[indices]), [glove_words[i] for i in indices], indices
 
 
-def fit_sbert_to_glove_pca(model, glove_words, glove_dim=100, max_words=1000):
-    sbert_embeddings = model.encode(glove_words[:max_words])
-    pca = PCA(n_components=glove_dim)
-    pca.fit(sbert_embeddings)
-    return pca
+def fit_sbert_to_glove_pca(model, glove_words, glove_dim=100, max_words=1000, batch_size=256):
+    """
+    Fit the PCA that maps SBERT embeddings to glove_dim dimensions, on the
+    first max_words GloVe words encoded batch_size at a time.
+    """
+    words = list(glove_words[:max_words])
+    batches = range(0, len(words), batch_size)
+    sbert_embeddings = np.concatenate([
+        np.asarray(model.encode(words[start:start + batch_size]), dtype=np.float32)
+        for start in tqdm(batches, desc="Encoding GloVe words with SBERT", leave=False)
+    ])
+    return fit_pca(sbert_embeddings, n_components=glove_dim)
 
 
 def encode_query_vector(word, model, sbert_to_glove_pca):
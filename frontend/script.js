@@ -1,226 +1,293 @@
-document.getElementById("search-btn").onclick = async () => {
-    const word = document.getElementById("word-input").value;
+// ============================
+// 📦 Dataset Loader (fetched once, revalidated with ETag)
+// ============================
 
-    try {
-        const res = await fetch("/query", {
-            method: "POST",
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ word })
-        });
+let dataset = null;
 
-        const data = await res.json();
-        if (data.error) throw new Error(data.error);
+function decodeBuffer(b64, ArrayType) {
+    const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+    return new ArrayType(bytes.buffer);
+}
 
-        const labels = data.labels;
-        const coords = data.positions;
-        const layers = data.layers;
+async function loadDataset() {
+    const res = await fetch("/dataset");
+    const raw = await res.json();
+    if (!res.ok) throw new Error(raw.error || `Dataset request failed (${res.status})`);
 
-        const queryCoords = data.query_coords;
-        const entryCoords = data.hnsw_entry_coords;
+    const positions = decodeBuffer(raw.positions, Float32Array);
+    const acornIndptr = decodeBuffer(raw.acorn_indptr, Int32Array);
+    const acornIndices = decodeBuffer(raw.acorn_indices, Int32Array);
 
-        const layerColors = { 0: 'gray', 1: 'orange', 2: 'gold' };
+    // Bounding box of the cloud; the plots keep fixed axis ranges so LOD updates don't rescale them
+    const low = [Infinity, Infinity, Infinity], high = [-Infinity, -Infinity, -Infinity];
+    for (let i = 0; i < positions.length; i++) {
+        low[i % 3] = Math.min(low[i % 3], positions[i]);
+        high[i % 3] = Math.max(high[i % 3], positions[i]);
+    }
 
-        // 📊 PLOT 1: Layer Visualization (true PCA positions, all layer nodes, no Z-offset)
-        const layerNameMap = { 0: 'Base Layer', 1: 'Middle Layer', 2: 'Entry Layer' };
+    dataset = {
+        id: (res.headers.get("ETag") || "").replace(/^W\//, "").replace(/"/g, ""),
+        numNodes: raw.num_nodes,
+        labels: raw.labels,
+        topLayer: decodeBuffer(raw.top_layer, Uint8Array),
+        bounds: { low, high },
+        position: i => [positions[3 * i], positions[3 * i + 1], positions[3 * i + 2]],
+        acornNeighbors: i => Array.from(acornIndices.subarray(acornIndptr[i], acornIndptr[i + 1]))
+    };
+    return dataset;
+}
 
-        // Organize all nodes by layer
-        const allLayerPoints = {};
-        for (let node in coords) {
-            const rawLayer = layers[node];
-            if (rawLayer === undefined) continue;
-            if (!allLayerPoints[rawLayer]) allLayerPoints[rawLayer] = [];
-            allLayerPoints[rawLayer].push({
-                id: node,
-                pos: coords[node],
-                label: labels[node]
-            });
-        }
+// ============================
+// 🔭 Level-of-detail point cloud
+// ============================
 
-        const layerTracesPlot1 = Object.entries(allLayerPoints).map(([layer, nodes]) => ({
-            type: 'scatter3d',
-            mode: 'markers',
-            name: layerNameMap[layer],
-            x: nodes.map(n => n.pos[0]),
-            y: nodes.map(n => n.pos[1]),
-            z: nodes.map(n => n.pos[2]),
-            text: nodes.map(n => n.label),
-            hoverinfo: 'text',
-            marker: {
-                size: 3,
-                color: layerColors[layer] || 'gray'
-            }
-        }));
+const LOD_BUDGET = 4000;  // Points drawn per plot
+const DEFAULT_EYE_DISTANCE = Math.hypot(1.25, 1.25, 1.25);  // Plotly's default camera
+const layerColors = { 0: 'gray', 1: 'orange', 2: 'gold' };
+const layerNameMap = { 0: 'Base Layer', 1: 'Middle Layer', 2: 'Entry Layer' };
+
+let lastQuery = null;       // { word, data } of the latest /query, redrawn on every camera change
+const plotCameras = {};     // Plot id -> last camera
+const lodRequests = {};     // Plot id -> sequence number of its latest /points request
+
+// Region of the cloud visible from camera (with some margin), or null when all of it is
+function viewBounds(camera) {
+    if (!camera || !camera.eye) return null;
+    const center = camera.center || { x: 0, y: 0, z: 0 };
+    const eye = camera.eye;
+    const zoom = DEFAULT_EYE_DISTANCE / Math.hypot(eye.x - center.x, eye.y - center.y, eye.z - center.z);
+    if (zoom <= 1.05) return null;
+
+    const { low, high } = dataset.bounds;
+    const bounds = [];
+    ["x", "y", "z"].forEach((axis, d) => {
+        const extent = high[d] - low[d];
+        const mid = (low[d] + high[d]) / 2 + center[axis] * extent;
+        bounds[d] = mid - 0.75 * extent / zoom;
+        bounds[d + 3] = mid + 0.75 * extent / zoom;
+    });
+    return bounds;
+}
 
-        // Query marker (in real position)
-        const queryTracePlot1 = {
-            type: 'scatter3d',
-            mode: 'markers',
-            name: 'Query Word',
-            x: [queryCoords[0]],
-            y: [queryCoords[1]],
-            z: [queryCoords[2]],
-            text: [word],
-            hoverinfo: 'text',
-            marker: {
-                size: 8,
-                color: 'red',
-                symbol: 'x'
-            }
-        };
+// Every node a traversal of the latest query touches; always drawn, whatever the LOD
+function pathNodes(data) {
+    const nodes = new Set([data.hnsw_entry_node, ...data.acorn.path]);
+    Object.values(data.hnsw.path).forEach(layerNodes => layerNodes.forEach(n => nodes.add(n)));
+    return [...nodes];
+}
 
-        Plotly.newPlot("layer-plot", [...layerTracesPlot1, queryTracePlot1], {
-            title: {
-                text: 'HNSW Structure by Layer',
-                font: { family: 'Inter, sans-serif', size: 18 },
-                pad: { t: 40, b: 10 }
-            },
-            scene: {
-                xaxis: { title: 'PCA 1' },
-                yaxis: { title: 'PCA 2' },
-                zaxis: { title: 'PCA 3' }
-            },
-            margin: { l: 0, r: 0, b: 0, t: 40 },
-            showlegend: true
+async function loadPoints(plotId) {
+    const params = new URLSearchParams({ budget: LOD_BUDGET });
+    const bounds = viewBounds(plotCameras[plotId]);
+    if (bounds) params.set("bounds", bounds.map(v => v.toFixed(4)).join(","));
+    if (lastQuery) params.set("include", pathNodes(lastQuery.data).join(","));
+
+    const request = lodRequests[plotId] = (lodRequests[plotId] || 0) + 1;
+    const res = await fetch(`/points?${params}`);
+    const raw = await res.json();
+    if (!res.ok) throw new Error(raw.error || `Points request failed (${res.status})`);
+    if (request !== lodRequests[plotId]) return null;  // A newer view superseded this one
+    return { ids: decodeBuffer(raw.ids, Int32Array), counts: decodeBuffer(raw.counts, Int32Array) };
+}
+
+function layerTraces(points, opacity) {
+    // Organize the drawn nodes by layer
+    const allLayerPoints = {};
+    points.ids.forEach((node, i) => {
+        const rawLayer = dataset.topLayer[node];
+        if (!allLayerPoints[rawLayer]) allLayerPoints[rawLayer] = [];
+        const count = points.counts[i];
+        allLayerPoints[rawLayer].push({
+            pos: dataset.position(node),
+            label: count > 1 ? `${dataset.labels[node]} (+${count - 1} nearby)` : dataset.labels[node]
         });
-        
+    });
+
+    return Object.entries(allLayerPoints).map(([layer, nodes]) => ({
+        type: 'scatter3d',
+        mode: 'markers',
+        name: layerNameMap[layer] || `Layer ${layer}`,
+        x: nodes.map(n => n.pos[0]),
+        y: nodes.map(n => n.pos[1]),
+        z: nodes.map(n => n.pos[2]),
+        text: nodes.map(n => n.label),
+        hoverinfo: 'text',
+        marker: {
+            size: 3,
+            color: layerColors[layer] || 'gray',
+            opacity
+        }
+    }));
+}
 
+function queryMarker(word, queryCoords) {
+    return {
+        type: 'scatter3d',
+        mode: 'markers',
+        name: 'Query Word',
+        x: [queryCoords[0]],
+        y: [queryCoords[1]],
+        z: [queryCoords[2]],
+        text: [word],
+        hoverinfo: 'text',
+        marker: {
+            size: 8,
+            color: 'red',
+            symbol: 'x'
+        }
+    };
+}
 
-        // 📊 PLOT 2: Traversal Visualization
-        const layerTracesPlot2 = Object.entries(allLayerPoints).map(([layer, nodes]) => ({
-            type: 'scatter3d',
-            mode: 'markers',
-            name: {
-                "0": "Base Layer",
-                "1": "Middle Layer",
-                "2": "Entry Layer"
-              }[layer] || `Layer ${layer}`,              
-            x: nodes.map(n => n.pos[0]),
-            y: nodes.map(n => n.pos[1]),
-            z: nodes.map(n => n.pos[2]),
-            text: nodes.map(n => n.label),
-            hoverinfo: 'text',
-            marker: {
-                size: 3,
-                color: layerColors[layer] || 'gray',
-                opacity: 0.4
-            }
-        }));
+function plotLayout(title) {
+    const { low, high } = dataset.bounds;
+    return {
+        title: {
+            text: title,
+            font: { family: 'Inter, sans-serif', size: 18 },
+            pad: { t: 40, b: 10 }
+        },
+        scene: {
+            xaxis: { title: 'PCA 1', range: [low[0], high[0]] },
+            yaxis: { title: 'PCA 2', range: [low[1], high[1]] },
+            zaxis: { title: 'PCA 3', range: [low[2], high[2]] },
+            aspectmode: 'cube'
+        },
+        uirevision: 'lod',  // Keep the camera (and legend toggles) across Plotly.react updates
+        margin: { l: 0, r: 0, b: 0, t: 40 },
+        showlegend: true
+    };
+}
 
-        const queryTrace = {
-            type: 'scatter3d',
-            mode: 'markers',
-            name: 'Query Word',
-            x: [queryCoords[0]],
-            y: [queryCoords[1]],
-            z: [queryCoords[2]],
-            text: [word],
-            hoverinfo: 'text',
-            marker: {
-                size: 8,
-                color: 'red',
-                symbol: 'x'
-            }
-        };
+// 📊 PLOT 1: Layer Visualization (true PCA positions, no Z-offset)
+async function drawLayerPlot() {
+    const points = await loadPoints("layer-plot");
+    if (!points) return;
+    const { word, data } = lastQuery;
 
-        const entryTrace = {
-            type: 'scatter3d',
-            mode: 'markers',
-            name: 'Entry Point',
-            x: [entryCoords[0]],
-            y: [entryCoords[1]],
-            z: [entryCoords[2]],
-            text: ['Entry'],
-            hoverinfo: 'text',
-            marker: {
-                size: 8,
-                color: 'blue',
-                symbol: 'diamond'
-            }
-        };
+    await Plotly.react("layer-plot", [...layerTraces(points, 1), queryMarker(word, data.query_coords)],
+        plotLayout('HNSW Structure by Layer'));
+    watchCamera("layer-plot", drawLayerPlot);
+}
 
-        const hnswLayerTraces = Object.entries(data.hnsw.path).map(([layer, nodeList]) => {
-            const pathCoords = nodeList.map(n => coords[n.toString()]);
-            return {
-                type: 'scatter3d',
-                mode: 'lines+markers',
-                name: `HNSW Path (${{
-                    "0": "Base Layer",
-                    "1": "Middle Layer",
-                    "2": "Entry Layer"
-                  }[layer] || `Layer ${layer}`})`,                  
-                x: pathCoords.map(c => c[0]),
-                y: pathCoords.map(c => c[1]),
-                z: pathCoords.map(c => c[2]),
-                text: nodeList.map(n => labels[n.toString()]),
-                hoverinfo: 'text',
-                marker: { size: 5, color: 'black' },
-                line: { width: 3, color: 'black', dash: 'dash' }
-            };
-        });
+// 📊 PLOT 2: Traversal Visualization
+async function drawTraversalPlot() {
+    const points = await loadPoints("traversal-plot");
+    if (!points) return;
+    const { word, data } = lastQuery;
+    const labels = dataset.labels;
+    const entryCoords = data.hnsw_entry_coords;
+
+    const entryTrace = {
+        type: 'scatter3d',
+        mode: 'markers',
+        name: 'Entry Point',
+        x: [entryCoords[0]],
+        y: [entryCoords[1]],
+        z: [entryCoords[2]],
+        text: ['Entry'],
+        hoverinfo: 'text',
+        marker: {
+            size: 8,
+            color: 'blue',
+            symbol: 'diamond'
+        }
+    };
 
-        const acornCoords = data.acorn.path.map(i => coords[i.toString()]);
-        const acornTrace = {
+    const hnswLayerTraces = Object.entries(data.hnsw.path).map(([layer, nodeList]) => {
+        const pathCoords = nodeList.map(n => dataset.position(n));
+        return {
             type: 'scatter3d',
             mode: 'lines+markers',
-            name: 'ACORN-1 Path',
-            x: acornCoords.map(c => c[0]),
-            y: acornCoords.map(c => c[1]),
-            z: acornCoords.map(c => c[2]),
-            text: data.acorn.path.map(i => labels[i.toString()]),
+            name: `HNSW Path (${layerNameMap[layer] || `Layer ${layer}`})`,
+            x: pathCoords.map(c => c[0]),
+            y: pathCoords.map(c => c[1]),
+            z: pathCoords.map(c => c[2]),
+            text: nodeList.map(n => labels[n]),
             hoverinfo: 'text',
-            marker: { size: 5, color: 'green' },
-            line: { width: 3, color: 'green' }
+            marker: { size: 5, color: 'black' },
+            line: { width: 3, color: 'black', dash: 'dash' }
         };
-
-
-        const acornRadiusTraces = [];
-
-        data.acorn.path.forEach(nodeIdx => {
-        const neighbors = data.acorn.neighbors[nodeIdx.toString()] || [];
-        const positions = neighbors.map(i => coords[i.toString()]);
-        const labelsList = neighbors.map(i => labels[i.toString()]);
-
-        acornRadiusTraces.push({
+    });
+
+    const acornCoords = data.acorn.path.map(i => dataset.position(i));
+    const acornTrace = {
+        type: 'scatter3d',
+        mode: 'lines+markers',
+        name: 'ACORN-1 Path',
+        x: acornCoords.map(c => c[0]),
+        y: acornCoords.map(c => c[1]),
+        z: acornCoords.map(c => c[2]),
+        text: data.acorn.path.map(i => labels[i]),
+        hoverinfo: 'text',
+        marker: { size: 5, color: 'green' },
+        line: { width: 3, color: 'green' }
+    };
+
+    const acornRadiusTraces = data.acorn.path.map(nodeIdx => {
+        const neighbors = dataset.acornNeighbors(nodeIdx);
+        const positions = neighbors.map(i => dataset.position(i));
+        return {
             type: 'scatter3d',
             mode: 'markers',
-            name: `ACORN Radius Neighbors - ${labels[nodeIdx.toString()]}`,
+            name: `ACORN Radius Neighbors - ${labels[nodeIdx]}`,
             x: positions.map(p => p[0]),
             y: positions.map(p => p[1]),
             z: positions.map(p => p[2]),
-            text: labelsList,
+            text: neighbors.map(i => labels[i]),
             hoverinfo: 'text',
             marker: {
-            size: 3,
-            color: 'rgba(24, 108, 24, 0.57)', // translucent green
-            symbol: 'circle'
+                size: 3,
+                color: 'rgba(24, 108, 24, 0.57)', // translucent green
+                symbol: 'circle'
             },
             visible: 'legendonly'
-        });
-        });
+        };
+    });
+
+    await Plotly.react("traversal-plot", [
+        ...layerTraces(points, 0.4),
+        queryMarker(word, data.query_coords),
+        entryTrace,
+        ...hnswLayerTraces,
+        acornTrace,
+        ...acornRadiusTraces
+    ], plotLayout(`HNSW v/s ACORN-1 Search Traversal for '${word}'`));
+    watchCamera("traversal-plot", drawTraversalPlot);
+}
 
+// Ask for a new LOD whenever the user stops rotating / zooming a plot
+function watchCamera(plotId, redraw) {
+    const plot = document.getElementById(plotId);
+    if (plot.dataset.lodWatched) return;
+    plot.dataset.lodWatched = "true";
+    let timer = null;
+    plot.on("plotly_relayout", event => {
+        if (!event["scene.camera"]) return;
+        plotCameras[plotId] = event["scene.camera"];
+        clearTimeout(timer);
+        timer = setTimeout(() => redraw().catch(err => console.error("LOD update failed:", err)), 250);
+    });
+}
 
-        Plotly.newPlot("traversal-plot", [
-            ...layerTracesPlot2,
-            queryTrace,
-            entryTrace,
-            ...hnswLayerTraces,
-            acornTrace,
-            ...acornRadiusTraces
-        ], {
-            title: {
-                text: `HNSW v/s ACORN-1 Search Traversal for '${word}'`,
-                font: { family: 'Inter, sans-serif', size: 18 },
-                pad: { t: 40, b: 10 }
-            },
-            scene: {
-                xaxis: { title: 'PCA 1' },
-                yaxis: { title: 'PCA 2' },
-                zaxis: { title: 'PCA 3' }
-            },
-            margin: { l: 0, r: 0, b: 0, t: 40 },
-            showlegend: true
+document.getElementById("search-btn").onclick = async () => {
+    const word = document.getElementById("word-input").value;
+
+    try {
+        const res = await fetch("/query", {
+            method: "POST",
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ word })
         });
-        
+
+        const data = await res.json();
+        if (data.error) throw new Error(data.error);
+
+        if (!dataset || dataset.id !== data.dataset_id) await loadDataset();
+        const labels = dataset.labels;
+
+        lastQuery = { word, data };
+        await Promise.all([drawLayerPlot(), drawTraversalPlot()]);
+
 
         //  Report panel
         document.getElementById("report").innerHTML = `
@@ -236,6 +303,7 @@ document.getElementById("search-btn").onclick = async () => {
             <p>Time: ${data.hnsw.time_ms} ms</p>
             <p>Traversal Steps: ${data.hnsw.num_visited}</p>
             <p>Cosine Sim: ${data.hnsw.similarity.toFixed(4)}</p>
+            <p><strong>Top-${data.hnsw.top_k.length}:</strong> ${data.hnsw.top_k.map(r => `${r.word} (${r.similarity.toFixed(3)})`).join(", ")}</p>
             <p><strong>Traversal Path:</strong></p>
             <div class="path-labels">
               ${
@@ -247,7 +315,7 @@ document.getElementById("search-btn").onclick = async () => {
                       "1": "Middle Layer",
                       "0": "Base Layer"
                     }[layer] || `Layer ${layer}`;
-                    return `<div><em>${readableLayer}:</em> ${nodes.map(n => labels[n.toString()]).join(" → ")}</div>`;
+                    return `<div><em>${readableLayer}:</em> ${nodes.map(n => labels[n]).join(" → ")}</div>`;
                   }).join("")
               }
             </div>
@@ -259,11 +327,21 @@ document.getElementById("search-btn").onclick = async () => {
             <p>Time: ${data.acorn.time_ms} ms</p>
             <p>Traversal Steps: ${data.acorn.num_visited}</p>
             <p>Cosine Sim: ${data.acorn.similarity.toFixed(4)}</p>
+            <p><strong>Top-${data.acorn.top_k.length}:</strong> ${data.acorn.top_k.map(r => `${r.word} (${r.similarity.toFixed(3)})`).join(", ")}</p>
             <p><strong>Traversal Path:</strong></p>
             <div class="path-labels">
-              ${data.acorn.path.map(i => labels[i.toString()]).join(" → ")}
+              ${data.acorn.path.map(i => labels[i]).join(" → ")}
             </div>
           </div>
+          ${data.algorithms.filter(a => a.name !== "hnsw" && a.name !== "acorn").map(({ name, label }) => `
+          <div class="widget-card">
+            <h3>${label} Result</h3>
+            <p><strong>Word:</strong> ${data[name].result}</p>
+            <p>Time: ${data[name].time_ms} ms</p>
+            <p>Nodes Scored: ${data[name].num_visited}</p>
+            <p>Cosine Sim: ${data[name].similarity.toFixed(4)}</p>
+            <p><strong>Top-${data[name].top_k.length}:</strong> ${data[name].top_k.map(r => `${r.word} (${r.similarity.toFixed(3)})`).join(", ")}</p>
+          </div>`).join("")}
         </div>
       `;
 
@@ -301,97 +379,153 @@ document.getElementById("search-btn").onclick = async () => {
 // 📋 Summary Report Loader
 // ============================
 
-async function loadSummary() {
+const SUMMARY_PAGE_SIZE = 50;
+let summaryOffset = 0;
+
+async function loadSummary(offset = summaryOffset) {
     try {
-      const res = await fetch("/summary");
+      const res = await fetch(`/summary?offset=${offset}&limit=${SUMMARY_PAGE_SIZE}`);
       const summary = await res.json();
-  
+      if (!res.ok) throw new Error(summary.error);
+      summaryOffset = offset;
+
+      // One column group per compared algorithm (see backend/ann_registry.py)
+      const algorithms = summary.algorithms;
+      const columns = (heading) => algorithms.map(({ label }) => `<th>${label} ${heading}</th>`).join("");
       let html = `<table>
         <tr>
           <th>Word</th>
-          <th>HNSW Time</th>
-          <th>ACORN Time</th>
-          <th>HNSW Traversal Steps</th>
-          <th>ACORN Traversal Steps</th>
-          <th>HNSW Cosine Similarity</th>
-          <th>ACORN Cosine Similarity</th>
+          ${columns("Time")}
+          ${columns("Traversal Steps")}
+          ${columns("Cosine Similarity")}
         </tr>`;
-  
-      let total = { h_time: 0, h_steps: 0, h_sim: 0, a_time: 0, a_steps: 0, a_sim: 0 };
-  
-      summary.forEach(row => {
+
+      // Recent searches (newest first), then this refresh's random sample queries
+      const rows = summary.entries.concat(summary.samples.map(row => ({ ...row, sample: true })));
+      rows.forEach(row => {
+        const cells = (format) => algorithms.map(({ name }) => `<td>${row[name] ? format(row[name]) : "–"}</td>`).join("");
         html += `<tr>
-          <td>${row.word}</td>
-          <td>${row.hnsw.time_ms} ms</td>
-          <td>${row.acorn.time_ms} ms</td>
-          <td>${row.hnsw.steps}</td>
-          <td>${row.acorn.steps}</td>
-          <td>${(row.hnsw.sim).toFixed(4)}</td>
-          <td>${(row.acorn.sim).toFixed(4)}</td>
+          <td>${row.word}${row.sample ? " <em>(sample)</em>" : ""}</td>
+          ${cells(r => `${r.time_ms} ms`)}
+          ${cells(r => r.steps)}
+          ${cells(r => r.sim.toFixed(4))}
         </tr>`;
-  
-        total.h_time += row.hnsw.time_ms;
-        total.h_steps += row.hnsw.steps;
-        total.h_sim += row.hnsw.sim;
-        total.a_time += row.acorn.time_ms;
-        total.a_steps += row.acorn.steps;
-        total.a_sim += row.acorn.sim;
       });
-  
-      const count = summary.length;
-      const avgRow = `
-        <tr style="font-weight: bold;">
-          <td>Average</td>
-          <td>${(total.h_time / count).toFixed(2)} ms</td>
-          <td>${(total.a_time / count).toFixed(2)} ms</td>
-          <td>${(total.h_steps / count).toFixed(2)}</td>
-          <td>${(total.a_steps / count).toFixed(2)}</td>
-          <td>${(total.h_sim / count).toFixed(4)}</td>
-          <td>${(total.a_sim / count).toFixed(4)}</td>
-        </tr>`;
-  
-      html += avgRow;
+      html += `</table>`;
+
+      // Pager over the retained log
+      const first = summary.retained ? summary.offset + 1 : 0;
+      const last = Math.min(summary.offset + summary.limit, summary.retained);
+      html += `<div class="summary-pager">
+        <button id="summary-newer" ${summary.offset === 0 ? "disabled" : ""}>Newer</button>
+        <span>Searches ${first}–${last} of the last ${summary.retained} (${summary.total} total)</span>
+        <button id="summary-older" ${last >= summary.retained ? "disabled" : ""}>Older</button>
+      </div>`;
       document.getElementById("summary-table").innerHTML = html;
-  
-      // 👆 Show averages above table
+      document.getElementById("summary-newer").onclick = () => loadSummary(Math.max(0, summaryOffset - SUMMARY_PAGE_SIZE));
+      document.getElementById("summary-older").onclick = () => loadSummary(summaryOffset + SUMMARY_PAGE_SIZE);
+
+      // 👆 Aggregates over every search since the server started
+      const aggregates = summary.aggregates;
+      if (!algorithms.some(({ name }) => aggregates[name] && aggregates[name].count)) {
+        document.getElementById("summary-averages").innerHTML = "<p>No searches logged yet.</p>";
+        return;
+      }
       const avgText = `
         <table class="avg-table">
             <thead>
             <tr>
                 <th style="text-align:left;">Algorithm</th>
+                <th>Searches</th>
                 <th>Avg Time (ms)</th>
+                <th>p50 / p95 Time (ms)</th>
                 <th>Avg Traversal Steps</th>
                 <th>Avg Cosine Similarity</th>
             </tr>
             </thead>
             <tbody>
-            <tr>
-                <td><strong>HNSW</strong></td>
-                <td>${(total.h_time / count).toFixed(2)}</td>
-                <td>${(total.h_steps / count).toFixed(2)}</td>
-                <td>${(total.h_sim / count).toFixed(4)}</td>
-            </tr>
-            <tr>
-                <td><strong>ACORN-1</strong></td>
-                <td>${(total.a_time / count).toFixed(2)}</td>
-                <td>${(total.a_steps / count).toFixed(2)}</td>
-                <td>${(total.a_sim / count).toFixed(4)}</td>
-            </tr>
+            ${algorithms.filter(({ name }) => aggregates[name] && aggregates[name].count).map(({ name, label }) => {
+                const agg = aggregates[name];
+                return `<tr>
+                <td><strong>${label}</strong></td>
+                <td>${agg.count}</td>
+                <td>${agg.mean_time_ms.toFixed(2)}</td>
+                <td>≤${agg.p50_time_ms} / ≤${agg.p95_time_ms}</td>
+                <td>${agg.mean_steps.toFixed(2)}</td>
+                <td>${agg.mean_sim.toFixed(4)}</td>
+            </tr>`;
+            }).join("")}
             </tbody>
         </table>
         `;
 
       document.getElementById("summary-averages").innerHTML = avgText;
-  
+
     } catch (err) {
       document.getElementById("summary-table").innerHTML = `<p style="color:red;">Error loading summary: ${err.message}</p>`;
     }
   }
-  
 
-  
+
+
+// ============================
+// 📈 Parameter Sweep Plot
+// ============================
+
+async function loadSweepResults() {
+    const container = document.getElementById("sweep-plot");
+    try {
+      const res = await fetch("/sweep_results");
+      const sweep = await res.json();
+      if (!res.ok) {
+        container.innerHTML = `<p>${sweep.error}</p>`;
+        return;
+      }
+
+      const describe = row => Object.entries(row.params)
+        .map(([key, value]) => `${key}=${value}`).join("<br>") +
+        `<br>ef_search=${row.ef_search}<br>memory=${(row.memory_bytes / 2 ** 20).toFixed(2)} MiB`;
+
+      // One series per algorithm; marker size grows with index memory
+      const traces = ["hnsw", "acorn"].map(algorithm => {
+        const rows = sweep.results.filter(row => row.algorithm === algorithm);
+        return {
+          x: rows.map(row => row.p50_ms),
+          y: rows.map(row => row.recall_at_k),
+          text: rows.map(describe),
+          mode: "markers",
+          type: "scatter",
+          name: algorithm === "hnsw" ? "HNSW" : "ACORN-1",
+          marker: { size: rows.map(row => 6 + 10 * row.memory_bytes / Math.max(...sweep.results.map(r => r.memory_bytes))) },
+          hovertemplate: "%{text}<br>p50=%{x} ms<br>recall=%{y}<extra></extra>"
+        };
+      });
+
+      traces.push({
+        x: sweep.pareto.map(row => row.p50_ms),
+        y: sweep.pareto.map(row => row.recall_at_k),
+        text: sweep.pareto.map(describe),
+        mode: "lines+markers",
+        type: "scatter",
+        name: "Pareto frontier",
+        line: { dash: "dot", color: "black" },
+        marker: { symbol: "star", size: 12, color: "gold", line: { color: "black", width: 1 } },
+        hovertemplate: "%{text}<br>p50=%{x} ms<br>recall=%{y}<extra></extra>"
+      });
+
+      Plotly.newPlot(container, traces, {
+        xaxis: { title: "p50 latency (ms)" },
+        yaxis: { title: `Recall@${sweep.config.k}` },
+        margin: { t: 20 }
+      });
+    } catch (err) {
+      container.innerHTML = `<p style="color:red;">Error loading sweep results: ${err.message}</p>`;
+    }
+  }
+
   document.getElementById("refresh-summary-btn").addEventListener("click", () => {
-    loadSummary();
+    loadSummary(0);
+    loadSweepResults();
   });
   
   
\ No newline at end of file